@@ -0,0 +1,304 @@
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import sys
+import time
+import tracemalloc
+from lab1.classes import *
+
+# name -> (regexp builder, sizes, input alphabet), see python -m lab1.bench run
+FAMILIES = {
+    'blowup': (lambda n: '(a|b)*a' + '(a|b)' * n, (4, 8, 12), 'ab'),
+    'nesting': (lambda n: '(' * n + 'a' + '|b)*' * n, (50, 200), 'ab'),
+    'concatenation': (lambda n: 'ab' * n, (100, 1000), 'ab'),
+    'alternation': (lambda n: '|'.join(format(i, 'b').zfill(n.bit_length()).replace('0', 'a').replace('1', 'b')
+                                       for i in range(n)), (16, 128, 1024), 'ab'),
+}
+QUICK_SIZES = {'blowup': (4,), 'nesting': (20,), 'concatenation': (50,), 'alternation': (8,)}
+# Metrics where a bigger value is an improvement; all others are costs.
+HIGHER_IS_BETTER = ('match_per_s', 're_per_s')
+
+
+def random_dka(count, lang='ab', seed=0) -> DKA:
+    rnd = random.Random(seed)
+    states = list(range(count))
+    moves = [{'in': i, 'out': rnd.randrange(count), 'move': sym} for i in states for sym in lang]
+    finish_states = [i for i in states if rnd.random() < 0.3]
+    return DKA(states, set(lang), moves, 0, finish_states)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def measure(func, *args):
+    # Wall time of a plain run, then peak traced memory of a second run.
+    start = time.perf_counter()
+    res = func(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return res, {'seconds': seconds, 'peak_kb': peak / 1024}
+
+
+def throughput(func, strings, budget=1.0):
+    # Calls per second, stopping early once budget seconds are spent so
+    # that a backtracking baseline cannot stall the suite.
+    start = time.perf_counter()
+    count = 0
+    seconds = 0.0
+    for string in strings:
+        func(string)
+        count += 1
+        seconds = time.perf_counter() - start
+        if seconds > budget:
+            break
+    return count / seconds if seconds else float('inf')
+
+
+def bench_regexp(regexp, alphabet, samples=2000, length=32, seed=0):
+    rnd = random.Random(seed)
+    res = {}
+    _, res['parse'] = measure(get_syntax_tree, f'({regexp})#')
+    dka, res['get_dka'] = measure(get_dka, f'({regexp})#')
+    res['states'] = len(dka.states)
+    res['transitions'] = len(dka.moves)
+    nka, res['get_nka'] = measure(lambda: get_nka(get_syntax_tree(f'({regexp})#'), 0)[0])
+    _, res['nka_to_dka'] = measure(nka_to_dka, nka)
+    copies = [get_dka(f'({regexp})#') for i in range(2)]
+    _, res['minimize'] = measure(lambda: copies.pop().minimize())
+    dka.minimize()
+    res['min_states'] = len(dka.states)
+
+    strings = [''.join(rnd.choice(alphabet) for _ in range(length)) for _ in range(samples)]
+    res['match_per_s'] = throughput(dka.compile().fullmatch, strings)
+    try:
+        res['re_per_s'] = throughput(re.compile(regexp).fullmatch, strings)
+    except (RecursionError, re.error, OverflowError):
+        res['re_per_s'] = None
+    return res
+
+
+def run_suite(families=None, quick=False):
+    results = {}
+    for name, (build, sizes, alphabet) in FAMILIES.items():
+        if families and name not in families:
+            continue
+        for n in QUICK_SIZES[name] if quick else sizes:
+            results[f'{name}[{n}]'] = bench_regexp(build(n), alphabet)
+    return {'meta': {'python': platform.python_version(), 'time': time.time(), 'quick': quick},
+            'results': results}
+
+
+def flatten(case):
+    for key, value in case.items():
+        if isinstance(value, dict):
+            for metric, x in value.items():
+                if isinstance(x, (int, float)):
+                    yield f'{key}.{metric}', x
+        elif isinstance(value, (int, float)):
+            yield key, value
+
+
+def compare(old, new, threshold=1.25, min_seconds=0.001):
+    # Regressions are (case, metric, old, new) where new is worse than old
+    # by more than threshold times; timings under min_seconds are noise.
+    regressions = []
+    for case, values in new['results'].items():
+        if case not in old['results']:
+            continue
+        before = dict(flatten(old['results'][case]))
+        for metric, after in flatten(values):
+            if metric not in before:
+                continue
+            prev = before[metric]
+            if metric.endswith('.seconds') and max(prev, after) < min_seconds:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                worse = after * threshold < prev
+            else:
+                worse = after > prev * threshold and after - prev > 0
+            if worse:
+                regressions.append((case, metric, prev, after))
+    return regressions
+
+
+def bench_minimize(sizes=(100, 200, 400, 800, 5000, 20000), legacy_limit=400):
+    rows = []
+    for count in sizes:
+        hopcroft = random_dka(count)
+        row = {'states': count, 'hopcroft': timed(hopcroft.minimize), 'minimal': len(hopcroft.states),
+               'table_filling': None}
+        if count <= legacy_limit:
+            row['table_filling'] = timed(random_dka(count).minimize_table_filling)
+        rows.append(row)
+    return rows
+
+
+def print_minimize():
+    print(f"{'states':>8} {'minimal':>8} {'hopcroft, s':>12} {'table filling, s':>17}")
+    for row in bench_minimize():
+        legacy = f"{row['table_filling']:.4f}" if row['table_filling'] is not None else '-'
+        print(f"{row['states']:>8} {row['minimal']:>8} {row['hopcroft']:>12.4f} {legacy:>17}")
+
+
+# name -> (regexp, input alphabet, string length, prefix, suffix) for
+# python -m lab1.bench codegen; inputs are prefix + random chars + suffix.
+CODEGEN_CASES = {
+    'blowup[8]': (FAMILIES['blowup'][0](8), 'ab', 32, '', ''),
+    'alternation[128]': (FAMILIES['alternation'][0](128), 'ab', 8, '', ''),
+    'comment': ('/[*]([^*]|[*][^/])*[*]/', 'ab /', 256, '/*', '*/'),
+    'identifier': ('[a-z_][a-z0-9_]*', 'abz_09', 64, '', ''),
+    'log line': ('[^ ]* [0-9]*ms', 'abc', 128, '', ' 12ms'),
+}
+
+
+def bench_codegen(cases=None, samples=2000, seed=0):
+    # Table-driven CompiledDKA.fullmatch against the generated matcher.
+    rnd = random.Random(seed)
+    rows = []
+    for name, (regexp, alphabet, length, prefix, suffix) in (cases or CODEGEN_CASES).items():
+        dka = get_dka(f'({regexp})#')
+        dka.minimize()
+        compiled = dka.compile()
+        generated, seconds = measure(dka.compile_to_python)
+        strings = [prefix + ''.join(rnd.choice(alphabet) for _ in range(length)) + suffix for _ in range(samples)]
+        rows.append({'case': name, 'states': len(compiled) - 1, 'generate': seconds['seconds'],
+                     'table_per_s': throughput(compiled.fullmatch, strings),
+                     'generated_per_s': throughput(generated.fullmatch, strings)})
+    return rows
+
+
+def print_codegen():
+    print(f"{'case':>18} {'states':>7} {'generate, s':>12} {'table/s':>10} {'generated/s':>12} {'speedup':>8}")
+    for row in bench_codegen():
+        print(f"{row['case']:>18} {row['states']:>7} {row['generate']:>12.4f} {row['table_per_s']:>10.0f} "
+              f"{row['generated_per_s']:>12.0f} {row['generated_per_s'] / row['table_per_s']:>7.1f}x")
+
+
+# name -> (regexp, input alphabet, line length, needle, share of lines
+# with the needle) for python -m lab1.bench prefilter: lines are searched
+# for the regexp, i.e. fullmatched against [^\n]*(regexp)[^\n]*.
+PREFILTER_CASES = {
+    'rare literal': ('error [0-9]*', 'abcdefgh ', 120, 'error 42', 0.01),
+    'alternation': ('(timeout|refused) on [a-z]*', 'abcdefgh ', 120, 'refused on x', 0.05),
+    'common literal': ('a[b-d]*e', 'abcde ', 120, 'abe', 0.5),
+}
+
+
+def bench_prefilter(cases=None, samples=5000, seed=0):
+    # Line search with the DKA alone against the DKA behind its prefilter.
+    rnd = random.Random(seed)
+    rows = []
+    for name, (regexp, alphabet, length, needle, share) in (cases or PREFILTER_CASES).items():
+        dka = get_dka(f'([^\n]*({regexp})[^\n]*)#')
+        dka.minimize()
+        lines = []
+        for i in range(samples):
+            line = ''.join(rnd.choice(alphabet) for _ in range(length))
+            if rnd.random() < share:
+                at = rnd.randrange(length)
+                line = line[:at] + needle + line[at:]
+            lines.append(line)
+        dka_per_s = throughput(dka.compile().fullmatch, lines)
+        prefiltered_per_s = throughput(dka.fullmatch, lines)
+        stats = dka.prefilter.stats()
+        rows.append({'case': name, 'literals': stats['literals'], 'skip_rate': stats['skip_rate'],
+                     'dka_per_s': dka_per_s, 'prefiltered_per_s': prefiltered_per_s})
+    return rows
+
+
+def print_prefilter():
+    print(f"{'case':>16} {'literals':>24} {'skipped':>8} {'dka/s':>10} {'prefiltered/s':>14} {'speedup':>8}")
+    for row in bench_prefilter():
+        print(f"{row['case']:>16} {', '.join(row['literals']):>24} {row['skip_rate']:>8.1%} "
+              f"{row['dka_per_s']:>10.0f} {row['prefiltered_per_s']:>14.0f} "
+              f"{row['prefiltered_per_s'] / row['dka_per_s']:>7.1f}x")
+
+
+def bench_parallel(sizes=(12, 14), processes=None):
+    # Serial nka_to_dka against parallel_nka_to_dka on the blowup family
+    # for 1, 2, 4, ... processes up to the number of cores.
+    from lab1.parallel import parallel_nka_to_dka
+    if processes is None:
+        count = os.cpu_count() or 1
+        processes = [1 << i for i in range(count.bit_length()) if 1 << i <= count]
+    rows = []
+    for n in sizes:
+        # Both timings start from an NKA built beforehand without any
+        # closures cached, so neither includes building it.
+        nka = get_nka(get_syntax_tree(f"({FAMILIES['blowup'][0](n)})#"), 0)[0]
+        fresh = nka.copy()
+        start = time.perf_counter()
+        states = len(nka_to_dka(fresh).compile()) - 1
+        serial = time.perf_counter() - start
+        for count in processes:
+            seconds = timed(parallel_nka_to_dka, nka.copy(), count)
+            rows.append({'case': f'blowup[{n}]', 'states': states, 'processes': count,
+                         'serial': serial, 'parallel': seconds})
+    return rows
+
+
+def print_parallel():
+    print(f"{'case':>12} {'states':>8} {'processes':>10} {'serial, s':>10} {'parallel, s':>12} {'speedup':>8}")
+    for row in bench_parallel():
+        print(f"{row['case']:>12} {row['states']:>8} {row['processes']:>10} {row['serial']:>10.3f} "
+              f"{row['parallel']:>12.3f} {row['serial'] / row['parallel']:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for lab1 automata construction and matching')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='run the regexp families and write JSON results')
+    run.add_argument('-o', '--output', default='bench_output.json')
+    run.add_argument('-f', '--family', action='append', choices=list(FAMILIES))
+    run.add_argument('--quick', action='store_true')
+    cmp = commands.add_parser('compare', help='flag regressions of NEW against OLD')
+    cmp.add_argument('old')
+    cmp.add_argument('new')
+    cmp.add_argument('--threshold', type=float, default=1.25)
+    commands.add_parser('minimize', help='Hopcroft against the table-filling minimizer')
+    commands.add_parser('codegen', help='table-driven matching against compile_to_python')
+    commands.add_parser('prefilter', help='line search with and without the literal prefilter')
+    commands.add_parser('parallel', help='serial against parallel subset construction')
+    args = parser.parse_args()
+
+    if args.command == 'minimize':
+        print_minimize()
+    elif args.command == 'codegen':
+        print_codegen()
+    elif args.command == 'prefilter':
+        print_prefilter()
+    elif args.command == 'parallel':
+        print_parallel()
+    elif args.command == 'run':
+        results = run_suite(args.family, args.quick)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        for case, values in results['results'].items():
+            print(f"{case:>20}: {values['states']:>6} states, get_dka {values['get_dka']['seconds']:.4f} s, "
+                  f"{values['match_per_s']:.0f} matches/s (re: {values['re_per_s'] or 0:.0f})")
+    else:
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        regressions = compare(old, new, args.threshold)
+        for case, metric, before, after in regressions:
+            print(f'REGRESSION {case} {metric}: {before:.6g} -> {after:.6g}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from collections import OrderedDict
+from lab1.classes import *
+
+# Part of every cache key: bump it whenever get_dka or minimize start to
+# build different automata, so that stale files are never loaded.
+COMPILER_VERSION = '4'
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'lab1')
+
+
+def load_compiled(path) -> CompiledDKA:
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return CompiledDKA.from_buffer(buffer)
+
+
+def replace_file(path, data: bytes):
+    # Writes a unique temp file next to path and renames it over path, so
+    # readers and concurrent writers (other processes or threads) only ever
+    # see complete files.
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                    dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def save_compiled(compiled: CompiledDKA, path):
+    replace_file(path, compiled.to_bytes())
+
+
+# A cache file is the CompiledDKA's binary form behind its length,
+# followed by JSON with the state keys of get_dka (position bitmasks)
+# and the literals of its prefilter.
+CACHE_FILE_HEADER = struct.Struct('<Q')
+
+
+def load_dka(path) -> DKA:
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(buffer) < CACHE_FILE_HEADER.size:
+        raise ValueError("Cache file is too short")
+    (size,) = CACHE_FILE_HEADER.unpack_from(buffer)
+    end = CACHE_FILE_HEADER.size + size
+    if len(buffer) < end:
+        raise ValueError("Cache file is truncated")
+    compiled = CompiledDKA.from_buffer(memoryview(buffer)[CACHE_FILE_HEADER.size:end])
+    meta = json.loads(buffer[end:].decode())
+    if len(meta['keys']) != len(compiled) - 1:
+        raise ValueError("Cache file keys do not match the automaton")
+    dka = DKA.from_compiled(compiled, meta['keys'], mask_to_set)
+    dka.prefilter = Prefilter(meta['literals'])
+    return dka
+
+
+def save_dka(dka: DKA, path):
+    data = dka.compile().to_bytes()
+    meta = {'keys': list(dka.keys), 'literals': list(dka.prefilter.literals)}
+    replace_file(path, CACHE_FILE_HEADER.pack(len(data)) + data + json.dumps(meta).encode())
+
+
+class DKACache(object):
+    def __init__(self, directory=CACHE_DIR, maxsize=256, minimize=True):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.minimize = minimize
+        self.memory = OrderedDict()
+        self.stats = {'memory': 0, 'disk': 0, 'compiled': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, regexp) -> str:
+        text = f'{COMPILER_VERSION}\0{int(self.minimize)}\0{regexp}'
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def path(self, regexp) -> str:
+        return os.path.join(self.directory, self.key(regexp) + '.dka')
+
+    def get(self, regexp) -> DKA:
+        # Callers get a copy, so that minimizing it or changing its views
+        # cannot leak into the cached automaton.
+        dka = self.memory.get(regexp)
+        if dka is not None:
+            self.memory.move_to_end(regexp)
+            self.stats['memory'] += 1
+            return dka.copy()
+
+        path = self.path(regexp)
+        try:
+            dka = load_dka(path)
+            self.stats['disk'] += 1
+        except (OSError, ValueError, KeyError):
+            dka = get_dka(regexp)
+            if self.minimize:
+                dka.minimize()
+            save_dka(dka, path)
+            self.stats['compiled'] += 1
+
+        self.memory[regexp] = dka
+        if len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+        return dka.copy()
+
+    def clear(self):
+        self.memory.clear()
+        for name in os.listdir(self.directory):
+            if name.endswith('.dka'):
+                os.remove(os.path.join(self.directory, name))
@@ -1,29 +1,107 @@
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_right
+from collections import deque, OrderedDict
+from contextlib import contextmanager, nullcontext
 from queue import SimpleQueue
+import json
+import logging
+import random
+import struct
+import sys
+import time
 from typing import List, Set
-from graphviz import Digraph
+from graphviz import Source
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def iter_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def mask_to_set(mask) -> Set[int]:
+    return set(iter_bits(mask))
 
 
 class Tree(object):
+    __slots__ = ('left', 'right', 'data', 'idx', 'is_nullable', 'first_mask', 'last_mask', 'followpos_table',
+                 'groups')
+
     def __init__(self, data, left=None, right=None):
         self.left = left
         self.right = right
         self.data = data
+        # Numbers of the capture groups that enclose exactly this node,
+        # innermost first; see get_syntax_tree.
+        self.groups = ()
         self.idx = None
+        self.is_nullable = None
+        self.first_mask = 0
+        self.last_mask = 0
+        self.followpos_table = None
 
     def __str__(self):
         return self.data
 
+    def postorder(self):
+        stack = [(self, False)]
+        while stack:
+            node, visited = stack.pop()
+            if visited:
+                yield node
+                continue
+            stack.append((node, True))
+            if node.right:
+                stack.append((node.right, False))
+            if node.left:
+                stack.append((node.left, False))
+
     def set_idx(self, count=1):
-        if not (self.left or self.right):
-            self.idx = count
-            return count + 1
-        if self.left:
-            count = self.left.set_idx(count)
-        if self.right:
-            count = self.right.set_idx(count)
+        for node in self.postorder():
+            if not (node.left or node.right):
+                node.idx = count
+                count += 1
         return count
 
+    def calc_attributes(self):
+        # nullable, firstpos and lastpos of every node are stored on it, with
+        # position sets as int bitsets (bit i is position i). followpos is
+        # kept on the root as a list of bitsets indexed by position.
+        follow = [0] * self.set_idx()
+        for node in self.postorder():
+            left, right = node.left, node.right
+            if node.data == '|':
+                node.is_nullable = left.is_nullable or right.is_nullable
+                node.first_mask = left.first_mask | right.first_mask
+                node.last_mask = left.last_mask | right.last_mask
+            elif node.data == '*':
+                node.is_nullable = True
+                node.first_mask = left.first_mask
+                node.last_mask = left.last_mask
+                for pos in iter_bits(node.last_mask):
+                    follow[pos] |= node.first_mask
+            elif node.data == 'cat':
+                node.is_nullable = left.is_nullable and right.is_nullable
+                node.first_mask = left.first_mask | right.first_mask if left.is_nullable else left.first_mask
+                node.last_mask = left.last_mask | right.last_mask if right.is_nullable else right.last_mask
+                for pos in iter_bits(left.last_mask):
+                    follow[pos] |= right.first_mask
+            else:
+                node.is_nullable = False
+                node.first_mask = node.last_mask = 1 << node.idx
+        self.followpos_table = follow
+        return follow
+
     def nullable(self) -> bool:
+        if self.is_nullable is not None:
+            return self.is_nullable
         if self.data == '|':
             return self.left.nullable() or self.right.nullable()
         if self.data == '*':
@@ -33,6 +111,8 @@ class Tree(object):
         return False
 
     def firstpos(self):
+        if self.is_nullable is not None:
+            return list(iter_bits(self.first_mask))
         if self.data == '|':
             return self.left.firstpos() + self.right.firstpos()
         if self.data == '*':
@@ -44,6 +124,8 @@ class Tree(object):
         return [self.idx]
 
     def lastpos(self):
+        if self.is_nullable is not None:
+            return list(iter_bits(self.last_mask))
         if self.data == '|':
             return self.left.lastpos() + self.right.lastpos()
         if self.data == '*':
@@ -55,6 +137,8 @@ class Tree(object):
         return [self.idx]
 
     def followpos(self, pos):
+        if self.followpos_table is not None:
+            return set(iter_bits(self.followpos_table[pos]))
         res = set()
         if self.data == '*' and pos in self.lastpos():
             res.update(set(self.firstpos()))
@@ -67,58 +151,1139 @@ class Tree(object):
         return res
 
 
+def state_key(state):
+    if isinstance(state, (set, frozenset)):
+        return frozenset(state)
+    return state
+
+
+class BuildStats(object):
+    # Optional observer for get_dka, get_nka, nka_to_dka and DKA.minimize:
+    # seconds per phase plus counters (states, transitions, peak_subset,
+    # worklist_peak, ...). At the end of every phase the numbers are sent
+    # to callback(phase, seconds, counters) and/or logged to logger. The
+    # builders only touch it between phases, so passing None costs nothing.
+    def __init__(self, callback=None, logger=None, level=logging.INFO):
+        self.phases = OrderedDict()
+        self.counters = {}
+        self.callback = callback
+        self.logger = logger
+        self.level = level
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        yield self
+        seconds = time.perf_counter() - start
+        self.phases[name] = self.phases.get(name, 0) + seconds
+        if self.callback is not None:
+            self.callback(name, seconds, dict(self.counters))
+        if self.logger is not None:
+            self.logger.log(self.level, '%s: %.6f s %s', name, seconds, self.counters)
+
+    def update(self, **counters):
+        self.counters.update(counters)
+
+    def as_dict(self):
+        return {'phases': dict(self.phases), **self.counters}
+
+
+def build_phase(stats, name):
+    return nullcontext() if stats is None else stats.phase(name)
+
+
+# Chars an Alphabet memoizes at most, so that input over a wide class
+# cannot grow it without bound.
+ALPHABET_MEMO_SIZE = 1 << 16
+
+
+class Alphabet(dict):
+    # Maps input chars to symbol values (ids, labels or masks), None for
+    # chars outside the alphabet. Chars inside class ranges are found by
+    # bisect and memoized on first lookup, so a lookup costs the same
+    # however wide the classes are. Chars outside the alphabet are not
+    # memoized: a miss usually ends the run anyway.
+    __slots__ = ('ranges', 'starts')
+
+    def __init__(self, ranges=()):
+        super().__init__()
+        self.ranges = sorted(ranges, key=lambda x: x[0])
+        self.starts = [lo for lo, hi, value in self.ranges]
+        for lo, hi, value in self.ranges:
+            if lo == hi:
+                self[chr(lo)] = value
+
+    @classmethod
+    def from_symbols(cls, values):
+        # values: symbol label (a char or a class like '[a-z]') -> value.
+        # Other labels, such as 'eps', match no input char.
+        ranges = []
+        for label, value in values.items():
+            if len(label) == 1 or label.startswith('['):
+                ranges.extend((lo, hi, value) for lo, hi in char_ranges(label))
+        return cls(ranges)
+
+    def __missing__(self, char):
+        if len(char) != 1:
+            return None
+        code = ord(char)
+        i = bisect_right(self.starts, code) - 1
+        if i < 0 or code > self.ranges[i][1]:
+            return None
+        value = self.ranges[i][2]
+        if len(self) < ALPHABET_MEMO_SIZE:
+            self[char] = value
+        return value
+
+
+# op -> (accepts(first accepts, second accepts),
+#        is_dead(first is dead, second is dead)) for CompiledDKA.product.
+PRODUCT_OPS = {
+    'intersection': (lambda a, b: a and b, lambda a, b: a or b),
+    'union': (lambda a, b: a or b, lambda a, b: a and b),
+    'difference': (lambda a, b: a and not b, lambda a, b: a),
+}
+
+
+def path_string(path, key):
+    # path: key -> (previous key, char) or None for the start key.
+    chars = []
+    while path[key] is not None:
+        key, char = path[key]
+        chars.append(char)
+    return ''.join(reversed(chars))
+
+
+def merge_labels(labels) -> str:
+    # Char and class labels are merged into one class label like '[0-9a-z]'
+    # (a lone char stays bare); other labels (such as 'eps') are appended as
+    # they are, comma separated, so a comma in a class is escaped too.
+    ranges = []
+    others = []
+    for label in labels:
+        if len(label) == 1 or label.startswith('['):
+            ranges.extend(char_ranges(label))
+        else:
+            others.append(label)
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(hi, merged[-1][1]))
+        else:
+            merged.append((lo, hi))
+
+    def show(code):
+        char = chr(code)
+        if not char.isprintable():
+            return ascii(char)[1:-1]
+        return '\\' + char if char in '\\]-^,' else char
+
+    parts = [show(lo) if lo == hi else f'{show(lo)}-{show(hi)}' for lo, hi in merged]
+    if len(merged) > 1 or merged and merged[0][0] != merged[0][1]:
+        parts = ['[' + ''.join(parts) + ']']
+    return ','.join(parts + sorted(others))
+
+
+def neighbourhood(edges, around, radius):
+    # States at most radius moves away from around, in either direction.
+    adjacent = {}
+    for state, target, label in edges:
+        adjacent.setdefault(state, set()).add(target)
+        adjacent.setdefault(target, set()).add(state)
+    kept = set(around)
+    frontier = list(kept)
+    for step in range(radius):
+        frontier = [x for state in frontier for x in adjacent.get(state, ()) if x not in kept]
+        kept.update(frontier)
+    return kept
+
+
+def write_fsm(out, count, start, accept, edges, format='dot', around=None, radius=1):
+    # Streams an automaton with states 0..count-1 to a path or text file as
+    # DOT or JSON. With around, only the states within radius moves of
+    # those states are written.
+    if not hasattr(out, 'write'):
+        with open(out, 'w', encoding='utf-8') as f:
+            return write_fsm(f, count, start, accept, edges, format, around, radius)
+    if format not in ('dot', 'json'):
+        raise ValueError(f"Unknown export format: {format}")
+    states = range(count)
+    if around is not None:
+        edges = list(edges)
+        kept = neighbourhood(edges, around, radius)
+        states = sorted(state for state in kept if 0 <= state < count)
+        accept = [state for state in accept if state in kept]
+        edges = (edge for edge in edges if edge[0] in kept and edge[1] in kept)
+
+    # Labels repeat a lot, so each one is quoted once; lines are written in
+    # batches.
+    quoted = {}
+    lines = []
+    if format == 'json':
+        out.write(f'{{"start": {start}, "states": {json.dumps(list(states))}, "accept": {json.dumps(accept)}, '
+                  f'"edges": [\n')
+        for state, target, label in edges:
+            text = quoted.get(label)
+            if text is None:
+                text = quoted[label] = json.dumps(label)
+            lines.append(f'[{state}, {target}, {text}]')
+            if len(lines) == 4096:
+                out.write(',\n'.join(lines) + ',\n')
+                lines = []
+        out.write(',\n'.join(lines) + '\n]}\n')
+        return
+
+    out.write('digraph finite_state_machine {\n\trankdir=LR\n')
+    accept = set(accept)
+    out.writelines(f'\tq{state} [shape=doublecircle]\n' if state in accept else f'\tq{state}\n' for state in states)
+    if around is None or start in kept:
+        out.write(f'\tstart [shape=point]\n\tstart -> q{start}\n')
+    for state, target, label in edges:
+        text = quoted.get(label)
+        if text is None:
+            text = quoted[label] = label.replace('\\', '\\\\').replace('"', '\\"')
+        lines.append(f'\tq{state} -> q{target} [label="{text}"]\n')
+        if len(lines) == 4096:
+            out.write(''.join(lines))
+            lines = []
+    out.write(''.join(lines) + '}\n')
+
+
+# Binary layout of a CompiledDKA, all little-endian: the header below, then
+# every symbol as a u16 length and its utf-8 bytes, zero padding up to a
+# 4-byte boundary, the int32 delta table and the packed accept bitmap.
+DKA_FORMAT_MAGIC = b'DKA\0'
+DKA_FORMAT_VERSION = 1
+DKA_FORMAT_HEADER = struct.Struct('<4sIIIII')
+
+
+def iter_chunks(buffer, chunk_size):
+    if hasattr(buffer, 'read'):
+        while True:
+            chunk = buffer.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        with memoryview(buffer) as view:
+            view = view.cast('B') if view.format != 'B' else view
+            for i in range(0, len(view), chunk_size):
+                yield view[i:i + chunk_size]
+
+
+class CompiledDKA(object):
+    # Dense form of a DKA: states are ints, `delta` is a flat row-major table
+    # of len(accept) rows by `width` symbols. Missing moves lead to `dead`,
+    # an extra sink state appended after the automaton's own states.
+    # Symbols may be classes of chars; `lookup` maps a char to its column.
+    __slots__ = ('symbols', 'lookup', 'delta', 'accept', 'start', 'width', 'dead', '_np_tables')
+
+    def __init__(self, symbols, delta, accept, start):
+        self.symbols = symbols
+        self.lookup = Alphabet.from_symbols(symbols)
+        self.delta = delta
+        self.accept = accept
+        self.start = start
+        self.width = len(symbols)
+        self.dead = len(accept) - 1
+        self._np_tables = None
+
+    def __len__(self):
+        return len(self.accept)
+
+    def step(self, state, char):
+        sym = self.lookup[char]
+        if sym is None:
+            return self.dead
+        return self.delta[state * self.width + sym]
+
+    def run(self, string, state=None):
+        delta = self.delta
+        lookup = self.lookup
+        width = self.width
+        dead = self.dead
+        if state is None:
+            state = self.start
+        for char in string:
+            sym = lookup[char]
+            if sym is None:
+                return dead
+            state = delta[state * width + sym]
+            if state == dead:
+                return dead
+        return state
+
+    def fullmatch(self, string) -> bool:
+        return bool(self.accept[self.run(string)])
+
+    def match(self, string) -> bool:
+        delta = self.delta
+        lookup = self.lookup
+        width = self.width
+        dead = self.dead
+        accept = self.accept
+        state = self.start
+        if accept[state]:
+            return True
+        for char in string:
+            sym = lookup[char]
+            if sym is None:
+                return False
+            state = delta[state * width + sym]
+            if state == dead:
+                return False
+            if accept[state]:
+                return True
+        return False
+
+    def eval_many(self, strings, batch_size=65536):
+        if np is None:
+            return array('B', [self.fullmatch(string) for string in strings])
+        results = []
+        batch = []
+        for string in strings:
+            batch.append(string)
+            if len(batch) == batch_size:
+                results.append(self._eval_batch(batch))
+                batch = []
+        if batch or not results:
+            results.append(self._eval_batch(batch))
+        return np.concatenate(results)
+
+    def to_bytes(self) -> bytes:
+        syms = sorted(self.symbols, key=self.symbols.get)
+        alphabet = b''.join(struct.pack('<H', len(sym.encode())) + sym.encode() for sym in syms)
+        alphabet += bytes(-(DKA_FORMAT_HEADER.size + len(alphabet)) % 4)
+        delta = array('i', self.delta)
+        if sys.byteorder != 'little':
+            delta.byteswap()
+        accept = bytearray((len(self.accept) + 7) // 8)
+        for i, flag in enumerate(self.accept):
+            if flag:
+                accept[i >> 3] |= 1 << (i & 7)
+        header = DKA_FORMAT_HEADER.pack(DKA_FORMAT_MAGIC, DKA_FORMAT_VERSION, len(self.accept), self.width,
+                                        self.start, len(alphabet))
+        return header + alphabet + delta.tobytes() + bytes(accept)
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        # The delta table is used in place when buffer is an mmap or any
+        # other buffer object, so loading does not copy it.
+        view = memoryview(buffer).cast('B')
+        if len(view) < DKA_FORMAT_HEADER.size:
+            raise ValueError("Buffer is too short for a compiled DKA")
+        magic, version, count, width, start, alphabet_len = DKA_FORMAT_HEADER.unpack_from(view)
+        if magic != DKA_FORMAT_MAGIC or version != DKA_FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled DKA format: {bytes(magic)!r} v{version}")
+        offset = DKA_FORMAT_HEADER.size
+        end = offset + alphabet_len
+        delta_end = end + 4 * count * width
+        if len(view) != delta_end + (count + 7) // 8:
+            raise ValueError("Compiled DKA buffer has a wrong size")
+
+        symbols = {}
+        while offset < end and len(symbols) < width:
+            (size,) = struct.unpack_from('<H', view, offset)
+            symbols[bytes(view[offset + 2:offset + 2 + size]).decode()] = len(symbols)
+            offset += 2 + size
+        if sys.byteorder == 'little':
+            delta = view[end:delta_end].cast('i')
+        else:
+            delta = array('i', view[end:delta_end])
+            delta.byteswap()
+        bits = view[delta_end:]
+        accept = bytearray((bits[i >> 3] >> (i & 7)) & 1 for i in range(count))
+        return cls(symbols, delta, accept, start)
+
+    def byte_table(self):
+        # Bytes are read as latin-1 characters; -1 marks bytes outside lang.
+        lookup = self.lookup
+        return [-1 if lookup[chr(byte)] is None else lookup[chr(byte)] for byte in range(256)]
+
+    def finditer(self, buffer, chunk_size=1 << 16):
+        # Yields (start, end) offsets of the leftmost-longest non-empty
+        # matches in a bytes-like object, mmap or binary file-like object.
+        # Live match attempts are kept as state -> earliest start: attempts
+        # that reach the same state have the same future, so the earliest
+        # one is all that matters. Only bytes from the earliest live
+        # attempt on are retained, and after a match the scan resumes at
+        # its end.
+        classes = self.byte_table()
+        delta = self.delta
+        width = self.width
+        dead = self.dead
+        accept = self.accept
+        start = self.start
+        # 1 for bytes a match can begin with, to skip to the next candidate
+        # start with bytearray.find while no attempt is live.
+        start_table = bytes(int(sym >= 0 and delta[start * width + sym] != dead) for sym in classes)
+
+        window = bytearray()
+        starts = bytearray()
+        base = 0
+        pos = 0
+        threads = {}
+        best = None
+        chunks = iter_chunks(buffer, chunk_size)
+        eof = False
+        while True:
+            while pos < base + len(window):
+                if not threads and best is None:
+                    skip = starts.find(1, pos - base)
+                    if skip < 0:
+                        pos = base + len(window)
+                        break
+                    pos = base + skip
+                if best is None and start not in threads:
+                    threads[start] = pos
+                sym = classes[window[pos - base]]
+                pos += 1
+                stepped = {}
+                if sym >= 0:
+                    for state, begin in threads.items():
+                        target = delta[state * width + sym]
+                        if target != dead and target not in stepped:
+                            stepped[target] = begin
+                threads = stepped
+                for state, begin in threads.items():
+                    if accept[state]:
+                        if best is None or begin <= best[0]:
+                            best = (begin, pos)
+                        break
+                if best is not None:
+                    if len(threads) > 1:
+                        threads = {state: begin for state, begin in threads.items() if begin <= best[0]}
+                    if not threads:
+                        yield best
+                        pos = best[1]
+                        best = None
+            if eof:
+                if best is None:
+                    return
+                yield best
+                pos = best[1]
+                best = None
+                threads = {}
+                continue
+
+            keep = min(pos, next(iter(threads.values()), pos))
+            if keep > base:
+                del window[:keep - base]
+                del starts[:keep - base]
+                base = keep
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+            else:
+                window += chunk
+                starts += bytes(chunk).translate(start_table)
+
+    def live_states(self):
+        width = self.width
+        delta = self.delta
+        dead = self.dead
+        reachable = bytearray(len(self.accept))
+        reachable[self.start] = 1
+        stack = [self.start]
+        back = [[] for i in range(dead)]
+        while stack:
+            state = stack.pop()
+            for target in delta[state * width:(state + 1) * width]:
+                if target == dead:
+                    continue
+                back[target].append(state)
+                if not reachable[target]:
+                    reachable[target] = 1
+                    stack.append(target)
+
+        live = bytearray(len(self.accept))
+        stack = [i for i in range(dead) if reachable[i] and self.accept[i]]
+        for state in stack:
+            live[state] = 1
+        while stack:
+            state = stack.pop()
+            for source in back[state]:
+                if not live[source]:
+                    live[source] = 1
+                    stack.append(source)
+        live[self.start] = 1
+        return live
+
+    def minimize(self, labels=None):
+        # Hopcroft's partition refinement over the live states plus the dead
+        # sink. Returns the minimal CompiledDKA and, for every old state,
+        # its new id or None if it was pruned as unreachable or dead.
+        # States start out split by labels (per-state hashable values),
+        # which default to the accept flags.
+        width = self.width
+        delta = self.delta
+        dead = self.dead
+        live = self.live_states()
+        states = [i for i in range(dead) if live[i]] + [dead]
+
+        def target(state, sym):
+            j = delta[state * width + sym]
+            return j if live[j] else dead
+
+        inverse = [{} for sym in range(width)]
+        for state in states:
+            if state == dead:
+                continue
+            for sym in range(width):
+                inverse[sym].setdefault(target(state, sym), []).append(state)
+        for sym in range(width):
+            inverse[sym].setdefault(dead, []).append(dead)
+
+        if labels is None:
+            labels = self.accept
+        groups = {}
+        for state in states:
+            groups.setdefault(labels[state] if state != dead else labels[dead], set()).add(state)
+        blocks = list(groups.values())
+        block_of = {}
+        for b, block in enumerate(blocks):
+            for state in block:
+                block_of[state] = b
+
+        largest = max(range(len(blocks)), key=lambda b: len(blocks[b]))
+        work = set((b, sym) for b in range(len(blocks)) if b != largest for sym in range(width))
+        while work:
+            splitter, sym = work.pop()
+            touched = {}
+            for state in blocks[splitter]:
+                for source in inverse[sym].get(state, ()):
+                    touched.setdefault(block_of[source], set()).add(source)
+            for b, part in touched.items():
+                if len(part) == len(blocks[b]):
+                    continue
+                blocks[b] -= part
+                new = len(blocks)
+                blocks.append(part)
+                for state in part:
+                    block_of[state] = new
+                for c in range(width):
+                    if (b, c) in work or len(part) <= len(blocks[b]):
+                        work.add((new, c))
+                    else:
+                        work.add((b, c))
+
+        # Renumber blocks in BFS order from the start state.
+        number = {block_of[self.start]: 0}
+        order = [block_of[self.start]]
+        for b in order:
+            state = next(iter(blocks[b]))
+            for sym in range(width):
+                t = block_of[target(state, sym)]
+                if t != block_of[dead] and t not in number:
+                    number[t] = len(order)
+                    order.append(t)
+        new_dead = len(order)
+        number[block_of[dead]] = new_dead
+
+        new_delta = array('i', [new_dead]) * ((new_dead + 1) * width)
+        new_accept = bytearray(new_dead + 1)
+        for i, b in enumerate(order):
+            state = next(iter(blocks[b]))
+            new_accept[i] = self.accept[state]
+            for sym in range(width):
+                new_delta[i * width + sym] = number[block_of[target(state, sym)]]
+
+        mapping = [None] * dead
+        for state in states:
+            if state != dead and block_of[state] in number and number[block_of[state]] != new_dead:
+                mapping[state] = number[block_of[state]]
+        return CompiledDKA(dict(self.symbols), new_delta, new_accept, 0), mapping
+
+    def common_columns(self, other):
+        # [(label, a char of it, column in self, column in other)] for the
+        # classes of chars that neither alphabet splits; a column is None
+        # where an automaton has no move on the class.
+        labels = [sym for sym in set(self.symbols) | set(other.symbols) if len(sym) == 1 or sym.startswith('[')]
+        columns = []
+        for label, (ranges, members) in sorted(split_alphabet(labels).items()):
+            char = chr(ranges[0][0])
+            columns.append((label, char, self.lookup[char], other.lookup[char]))
+        return columns
+
+    def target(self, state, sym):
+        return self.dead if sym is None else self.delta[state * self.width + sym]
+
+    def product(self, other, op):
+        # Product automaton for op in PRODUCT_OPS. Only pairs reachable from
+        # the pair of start states are built, and pairs that can never
+        # accept under op collapse into the dead sink.
+        accepts, is_dead = PRODUCT_OPS[op]
+        columns = {label: (i, j) for label, char, i, j in self.common_columns(other)}
+
+        def step(pair, sym):
+            i, j = columns[sym]
+            p = self.target(pair[0], i)
+            q = other.target(pair[1], j)
+            return None if is_dead(p == self.dead, q == other.dead) else (p, q)
+
+        def is_final(pair):
+            return accepts(self.accept[pair[0]], other.accept[pair[1]])
+
+        compiled, keys = SubsetBuilder(columns, step, is_final).build((self.start, other.start))
+        return compiled
+
+    def complement(self):
+        # Strings of any chars that self rejects: the old dead sink becomes
+        # an accepting state that loops on every class, and a new class of
+        # all chars outside the alphabet leads there from every state.
+        outside = complement_ranges(sorted(r for sym in self.symbols if len(sym) == 1 or sym.startswith('[')
+                                           for r in char_ranges(sym)))
+        rest = self.dead
+        symbols = dict(self.symbols)
+        width = self.width
+        delta = array('i', self.delta)
+        if outside:
+            symbols[class_label(outside)] = width
+            width += 1
+            delta = array('i')
+            for state in range(rest + 1):
+                delta.extend(self.delta[state * self.width:(state + 1) * self.width])
+                delta.append(rest)
+        delta += array('i', [rest + 1]) * width
+        for sym in range(width):
+            delta[rest * width + sym] = rest
+        accept = bytearray(1 - flag for flag in self.accept) + bytearray(1)
+        return CompiledDKA(symbols, delta, accept, self.start)
+
+    def equivalence_counterexample(self, other):
+        # Hopcroft-Karp: states of both automata are merged in a union-find
+        # as pairs are visited, so a pair is only expanded if its states are
+        # not already known to be equivalent. Returns a shortest found string
+        # accepted by exactly one of the automata, or None if they are
+        # equivalent.
+        columns = [(char, i, j) for label, char, i, j in self.common_columns(other)]
+        offset = len(self)
+        parent = list(range(offset + len(other)))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        start = (self.start, other.start)
+        parent[self.start] = offset + other.start
+        path = {start: None}
+        work = deque([start])
+        while work:
+            pair = work.popleft()
+            if self.accept[pair[0]] != other.accept[pair[1]]:
+                return path_string(path, pair)
+            for char, i, j in columns:
+                p = self.target(pair[0], i)
+                q = other.target(pair[1], j)
+                a, b = find(p), find(offset + q)
+                if a != b:
+                    parent[a] = b
+                    path[(p, q)] = (pair, char)
+                    work.append((p, q))
+        return None
+
+    def inclusion_counterexample(self, other):
+        # A string accepted by self but not by other, or None if the
+        # language of self is a subset of the language of other.
+        columns = [(char, i, j) for label, char, i, j in self.common_columns(other)]
+        start = (self.start, other.start)
+        path = {start: None}
+        work = deque([start])
+        while work:
+            pair = work.popleft()
+            if self.accept[pair[0]] and not other.accept[pair[1]]:
+                return path_string(path, pair)
+            if pair[0] == self.dead:
+                continue
+            for char, i, j in columns:
+                target = (self.target(pair[0], i), other.target(pair[1], j))
+                if target not in path:
+                    path[target] = (pair, char)
+                    work.append(target)
+        return None
+
+    def class_sizes(self):
+        # Number of chars behind every symbol (0 for labels like 'eps').
+        sizes = [0] * self.width
+        for lo, hi, sym in self.lookup.ranges:
+            sizes[sym] += hi - lo + 1
+        return sizes
+
+    def count_matrix(self):
+        # (live states, matrix) with matrix[i][j] the number of chars that
+        # lead from live state i to live state j.
+        live = self.live_states()
+        states = [state for state in range(self.dead) if live[state]]
+        index = {state: i for i, state in enumerate(states)}
+        sizes = self.class_sizes()
+        matrix = [[0] * len(states) for state in states]
+        for i, state in enumerate(states):
+            for sym in range(self.width):
+                j = index.get(self.delta[state * self.width + sym])
+                if j is not None:
+                    matrix[i][j] += sizes[sym]
+        return states, matrix
+
+    def count(self, n, mod=None):
+        # Number of accepted strings of length n (modulo mod if given), by
+        # exponentiation by squaring of the transition count matrix. Counts
+        # are Python ints unless mod keeps every product inside int64.
+        states, matrix = self.count_matrix()
+        if self.start not in states:
+            return 0
+        vector = [self.accept[state] for state in states]
+        start = states.index(self.start)
+        if np is None:
+            def mul(a, b):
+                res = [[sum(x * y for x, y in zip(row, col)) for col in zip(*b)] for row in a]
+                return [[x % mod for x in row] for row in res] if mod else res
+            power = matrix
+            vector = [[x] for x in vector]
+            while n:
+                if n & 1:
+                    vector = mul(power, vector)
+                power = mul(power, power)
+                n >>= 1
+            return vector[start][0]
+
+        fits = mod is not None and (mod - 1) ** 2 * len(states) < 2 ** 63
+        dtype = np.int64 if fits else object
+        power = np.array(matrix, dtype=dtype)
+        vector = np.array(vector, dtype=dtype)
+        if mod:
+            power %= mod
+        while n:
+            if n & 1:
+                vector = power @ vector
+                if mod:
+                    vector %= mod
+            power = power @ power
+            if mod:
+                power %= mod
+            n >>= 1
+        return int(vector[start])
+
+    def sample(self, n, k, seed=None):
+        # k accepted strings of length n, uniform and independent. A uniform
+        # rank below count(n) is decoded one char at a time: counts[t] holds
+        # the accepted suffixes of length t from every live state, and the
+        # next char is the one whose block of suffixes contains the rank.
+        # All k ranks are decoded at once.
+        total = self.count(n)
+        if not total:
+            raise ValueError(f"No accepted strings of length {n}")
+        states, matrix = self.count_matrix()
+        m = len(states)
+        index = {state: i for i, state in enumerate(states)}
+        sizes = self.class_sizes()
+        # moves[i][sym]: live target index, or m for a row of zero counts.
+        moves = [[index.get(self.delta[state * self.width + sym], m) for sym in range(self.width)] for state in states]
+        ranges = [[] for sym in range(self.width)]
+        for lo, hi, sym in sorted(self.lookup.ranges):
+            ranges[sym].append((lo, hi))
+        rnd = random.Random(seed)
+        ranks = [rnd.randrange(total) for i in range(k)]
+        start = index[self.start]
+        if np is None:
+            counts = [[self.accept[state] for state in states] + [0]]
+            for t in range(n):
+                counts.append([sum(x * y for x, y in zip(row, counts[-1])) for row in matrix] + [0])
+            return [self._unrank(rank, n, start, counts, moves, sizes, ranges) for rank in ranks]
+
+        # Only counts of states reachable at the matching depth are read and
+        # those are at most total, so int64 is exact even if others wrap.
+        dtype = np.int64 if total < 2 ** 62 else object
+        matrix = np.array(matrix, dtype=dtype).reshape(m, m)
+        counts = [np.append(np.array([self.accept[state] for state in states], dtype=dtype), 0)]
+        for t in range(n):
+            counts.append(np.append(matrix @ counts[-1][:m], 0))
+        firsts = []
+        for sym in range(self.width):
+            lengths = [hi - lo + 1 for lo, hi in ranges[sym]]
+            firsts.append((np.array([lo for lo, hi in ranges[sym]], dtype=np.int64),
+                           np.cumsum([0] + lengths[:-1]).astype(np.int64)))
+
+        moves = np.array(moves, dtype=np.int64).reshape(m, self.width)
+        sizes = np.array(sizes, dtype=dtype)
+        ranks = np.array(ranks, dtype=dtype)
+        state = np.full(k, start, dtype=np.int64)
+        rows = np.arange(k)
+        chars = np.zeros((k, n), dtype=np.int64)
+        with np.errstate(over='ignore'):
+            for i in range(n):
+                suffixes = counts[n - 1 - i]
+                targets = moves[state]
+                blocks = sizes * suffixes[targets]
+                ends = np.cumsum(blocks, axis=1)
+                sym = (ends <= ranks[:, None]).sum(axis=1)
+                rest = ranks - (ends[rows, sym] - blocks[rows, sym])
+                state = targets[rows, sym]
+                per = suffixes[state]
+                offsets = (rest // per).astype(np.int64)
+                ranks = rest % per
+                for x in np.unique(sym):
+                    pick = sym == x
+                    lows, starts = firsts[x]
+                    j = np.searchsorted(starts, offsets[pick], side='right') - 1
+                    chars[pick, i] = lows[j] + offsets[pick] - starts[j]
+        return [''.join(map(chr, row)) for row in chars.tolist()]
+
+    @staticmethod
+    def _unrank(rank, n, state, counts, moves, sizes, ranges):
+        # sample() without NumPy, for a single rank.
+        chars = []
+        for t in range(n - 1, -1, -1):
+            for sym in range(len(sizes)):
+                per = counts[t][moves[state][sym]]
+                block = sizes[sym] * per
+                if rank < block:
+                    offset = rank // per
+                    rank %= per
+                    state = moves[state][sym]
+                    for lo, hi in ranges[sym]:
+                        if offset <= hi - lo:
+                            chars.append(chr(lo + offset))
+                            break
+                        offset -= hi - lo + 1
+                    break
+                rank -= block
+        return ''.join(chars)
+
+    def _get_np_tables(self):
+        # Column `width` of the table is a dead symbol used for characters
+        # outside of the alphabet.
+        if self._np_tables is None:
+            count = len(self.accept)
+            delta = np.full((count, self.width + 1), self.dead, dtype=np.int32)
+            delta[:, :self.width] = np.frombuffer(self.delta, dtype=np.int32).reshape(count, self.width)
+            ranges = self.lookup.ranges
+            lows = np.array([lo for lo, hi, i in ranges], dtype=np.uint32)
+            highs = np.array([hi for lo, hi, i in ranges], dtype=np.uint32)
+            ids = np.array([i for lo, hi, i in ranges] + [self.width], dtype=np.int32)
+            accept = np.frombuffer(bytes(self.accept), dtype=np.uint8).astype(bool)
+            self._np_tables = delta, lows, highs, ids, accept
+        return self._np_tables
+
+    def _eval_batch(self, strings):
+        delta, lows, highs, ids, accept = self._get_np_tables()
+        res = np.zeros(len(strings), dtype=bool)
+        groups = {}
+        for i, string in enumerate(strings):
+            groups.setdefault(len(string), []).append(i)
+        for length, idx in groups.items():
+            states = np.full(len(idx), self.start, dtype=np.int32)
+            if length:
+                text = ''.join([strings[i] for i in idx]).encode('utf-32-le')
+                codes = np.frombuffer(text, dtype='<u4').reshape(len(idx), length)
+                pos = np.searchsorted(lows, codes, side='right') - 1
+                known = (pos >= 0) & (codes <= highs[np.maximum(pos, 0)]) if len(lows) else pos >= 0
+                syms = ids[np.where(known, pos, len(lows))]
+                for col in range(length):
+                    states = delta[states, syms[:, col]]
+            res[idx] = accept[states]
+        return res
+
+
 class DKA(object):
+    # A DKA made by from_compiled keeps only its CompiledDKA and one key per
+    # state; the legacy views (states as label(key), moves as dicts,
+    # moves_table, ...) are built on first access.
+    __slots__ = ('_keys', '_label', '_states', '_lang', '_moves', '_q0', '_finish_states', '_compiled',
+                 '_moves_table', 'prefilter')
+
     def __init__(self, states, lang, moves, q0, finish_states):
-        self.states = states
-        self.moves = moves
-        self.lang = lang
-        self.q0 = q0
-        self.finish_states = finish_states
+        self.prefilter = Prefilter()
+        self._keys = states
+        self._label = None
+        self._states = states
+        self._moves = moves
+        self._lang = lang
+        self._q0 = q0
+        self._finish_states = finish_states
+        self._compiled = None
+        self._moves_table = None
+
+    @property
+    def keys(self):
+        # State keys before label is applied, or ids if there are none.
+        return self._keys if self._keys is not None else range(len(self.compile()) - 1)
+
+    def state(self, i):
+        if self._keys is None:
+            return i
+        return self._keys[i] if self._label is None else self._label(self._keys[i])
+
+    @property
+    def states(self):
+        if self._states is None:
+            self._states = [self.state(i) for i in range(len(self._compiled) - 1)]
+        return self._states
+
+    def _detach(self):
+        # Before a view is replaced, the others are built from the compiled
+        # table, which is then dropped along with everything derived from
+        # it; compile() rebuilds it from the views.
+        if self._compiled is not None:
+            self.states, self.lang, self.moves, self.q0, self.finish_states
+            self._compiled = None
+        self._moves_table = None
+        self.prefilter = Prefilter()
+
+    @states.setter
+    def states(self, value):
+        self._detach()
+        self._keys = self._states = value
+        self._label = None
+
+    @property
+    def lang(self):
+        if self._lang is None:
+            self._lang = set(self._compiled.symbols)
+        return self._lang
+
+    @lang.setter
+    def lang(self, value):
+        self._detach()
+        self._lang = value
+
+    @property
+    def moves(self):
+        if self._moves is None:
+            compiled = self._compiled
+            states = self.states
+            syms = sorted(compiled.symbols, key=compiled.symbols.get)
+            self._moves = []
+            for i, state in enumerate(states):
+                row = i * compiled.width
+                for j, sym in enumerate(syms):
+                    target = compiled.delta[row + j]
+                    if target != compiled.dead:
+                        self._moves.append({'in': state, 'out': states[target], 'move': sym})
+        return self._moves
+
+    @moves.setter
+    def moves(self, value):
+        self._detach()
+        self._moves = value
+
+    @property
+    def q0(self):
+        if self._q0 is None:
+            self._q0 = self.states[self._compiled.start]
+        return self._q0
+
+    @q0.setter
+    def q0(self, value):
+        self._detach()
+        self._q0 = value
+
+    @property
+    def finish_states(self):
+        if self._finish_states is None:
+            accept = self._compiled.accept
+            self._finish_states = [state for i, state in enumerate(self.states) if accept[i]]
+        return self._finish_states
+
+    @finish_states.setter
+    def finish_states(self, value):
+        self._detach()
+        self._finish_states = value
+
+    @property
+    def moves_table(self):
+        if self._moves_table is None:
+            index = {state_key(state): i for i, state in enumerate(self.states)}
+            self._moves_table = [[[] for x in self.states] for y in self.states]
+            for move in self.moves:
+                i = index[state_key(move['in'])]
+                j = index[state_key(move['out'])]
+                self._moves_table[i][j].append(move['move'])
+        return self._moves_table
 
-        self.moves_table = [[[] for x in states] for y in states]
-        for move in moves:
-            i = self.states.index(move['in'])
-            j = self.states.index(move['out'])
-            self.moves_table[i][j].append(move['move'])
+    @moves_table.setter
+    def moves_table(self, value):
+        self._moves_table = value
 
     def is_terminal(self, state):
         return state in self.finish_states
 
-    def draw_fsm(self):
-        f = Digraph('finite_state_machine', filename='fsm.gv')
-        for state in self.states:
-            moves = [move for move in self.moves if move['in'] == state or move['out'] == state]
-            if not moves:
-                continue
-            if state in self.finish_states:
-                f.node(f'q{self.states.index(state)}', shape='doublecircle')
-            else:
-                f.node(f'q{self.states.index(state)}')
+    def compile(self) -> CompiledDKA:
+        if self._compiled is not None:
+            return self._compiled
+        index = {state_key(state): i for i, state in enumerate(self.states)}
+        # Char and class labels may overlap, so they are split into
+        # disjoint classes first and a move sets every class of its label.
+        labels = [sym for sym in self.lang if len(sym) == 1 or sym.startswith('[')]
+        classes = split_alphabet(labels)
+        symbols = {sym: i for i, sym in enumerate(sorted(classes) + sorted(set(self.lang) - set(labels)))}
+        columns = {sym: [symbols[sym]] for sym in self.lang if sym not in labels}
+        for label, (ranges, members) in classes.items():
+            for sym in members:
+                columns.setdefault(sym, []).append(symbols[label])
+        width = len(symbols)
+        dead = len(self.states)
+        delta = array('i', [dead]) * ((dead + 1) * width)
         for move in self.moves:
-            f.edge(f"q{self.states.index(move['in'])}", f"q{self.states.index(move['out'])}", move['move'])
-        f.view()
+            row = index[state_key(move['in'])] * width
+            target = index[state_key(move['out'])]
+            for sym in columns.get(move['move'], ()):
+                delta[row + sym] = target
+        accept = bytearray(dead + 1)
+        for state in self.finish_states:
+            accept[index[state_key(state)]] = 1
+        self._compiled = CompiledDKA(symbols, delta, accept, index[state_key(self.q0)])
+        return self._compiled
+
+    def match(self, string) -> bool:
+        return self.prefilter.may_match(string) and self.compile().match(string)
+
+    def fullmatch(self, string) -> bool:
+        return self.prefilter.may_match(string) and self.compile().fullmatch(string)
+
+    def eval_many(self, strings, batch_size=65536):
+        # Only the strings that pass the prefilter reach the DKA.
+        if not self.prefilter:
+            return self.compile().eval_many(strings, batch_size)
+        strings = list(strings)
+        passed = [i for i, string in enumerate(strings) if self.prefilter.may_match(string)]
+        found = self.compile().eval_many([strings[i] for i in passed], batch_size)
+        if np is None:
+            res = array('B', bytes(len(strings)))
+            for i, flag in zip(passed, found):
+                res[i] = flag
+            return res
+        res = np.zeros(len(strings), dtype=bool)
+        res[passed] = found
+        return res
+
+    def finditer(self, buffer, chunk_size=1 << 16):
+        # A buffer without any required literal has no matches; file-like
+        # objects are streamed without the check.
+        if self.prefilter and hasattr(buffer, 'find') and not self.prefilter.may_match(buffer):
+            return iter(())
+        return self.compile().finditer(buffer, chunk_size)
+
+    def edges(self):
+        # (state, target, label) with the moves between two states merged
+        # into one range label, read off the compiled table.
+        compiled = self.compile()
+        width = compiled.width
+        delta = compiled.delta
+        syms = sorted(compiled.symbols, key=compiled.symbols.get)
+        labels = {}
+        for state in range(compiled.dead):
+            targets = {}
+            for sym, target in enumerate(delta[state * width:(state + 1) * width]):
+                if target != compiled.dead:
+                    targets.setdefault(target, []).append(sym)
+            for target, group in targets.items():
+                key = tuple(group)
+                label = labels.get(key)
+                if label is None:
+                    label = labels[key] = merge_labels([syms[sym] for sym in group])
+                yield state, target, label
+
+    def export(self, out, format='dot', around=None, radius=1):
+        compiled = self.compile()
+        accept = [i for i in range(compiled.dead) if compiled.accept[i]]
+        write_fsm(out, compiled.dead, compiled.start, accept, self.edges(), format, around, radius)
+
+    def draw_fsm(self, filename='fsm.gv', view=True, around=None, radius=1):
+        self.export(filename, around=around, radius=radius)
+        if view:
+            Source.from_file(filename).view()
 
     def eval(self, string):
-        current_state = self.states.index(self.q0)
-        for i in range(len(string)):
-            if string[i] not in self.lang:
+        compiled = self.compile()
+        current_state = compiled.start
+        for char in string:
+            if compiled.lookup[char] is None:
                 print("Wrong symbol detected")
                 return False
-            found = False
-            for moves in self.moves_table[current_state]:
-                if string[i] in moves:
-                    current_state = self.moves_table[current_state].index(moves)
-                    found = True
-            if not found:
+            current_state = compiled.step(current_state, char)
+            if current_state == compiled.dead:
                 print("String can not be evaluated")
                 return False
-        if self.states[current_state] not in self.finish_states:
+        if not compiled.accept[current_state]:
             print("String finish in non-finish state")
             return False
         print("String evaluated successfully")
         return True
 
-    def minimize(self):
+    @classmethod
+    def from_compiled(cls, compiled, keys=None, label=None):
+        # State i is label(keys[i]), keys[i] without label, or just i.
+        dka = cls.__new__(cls)
+        dka.prefilter = Prefilter()
+        dka._keys = keys
+        dka._label = label
+        dka._states = dka._lang = dka._moves = dka._q0 = dka._finish_states = None
+        dka._compiled = compiled
+        dka._moves_table = None
+        return dka
+
+    def copy(self) -> 'DKA':
+        # Shares the compiled table, which minimize and the setters replace
+        # rather than change, so the copy can be changed on its own.
+        dka = DKA.from_compiled(self.compile(), self._keys, self._label)
+        dka.prefilter = Prefilter(self.prefilter.literals)
+        return dka
+
+    def minimize(self, stats: BuildStats = None):
+        compiled = self.compile()
+        with build_phase(stats, 'minimize'):
+            minimized, mapping = compiled.minimize()
+            if stats is not None:
+                stats.update(minimized_states=len(minimized) - 1)
+        keys = self._keys if self._keys is not None else range(len(compiled) - 1)
+        reps = [None] * (len(minimized) - 1)
+        for i, j in enumerate(mapping):
+            if j is not None and reps[j] is None:
+                reps[j] = keys[i]
+        self._keys = reps
+        self._states = self._lang = self._moves = self._q0 = self._finish_states = None
+        self._compiled = minimized
+        self._moves_table = None
+        return mapping
+
+    def compile_to_python(self, directory=None):
+        # Module with generated fullmatch/match functions, see lab1.codegen
+        # (imported here since it builds on this module).
+        from lab1.codegen import load_matcher
+        return load_matcher(self.compile(), directory)
+
+    def count(self, n, mod=None) -> int:
+        return self.compile().count(n, mod)
+
+    def sample(self, n, k, seed=None) -> List[str]:
+        return self.compile().sample(n, k, seed)
+
+    def intersection(self, other) -> 'DKA':
+        return DKA.from_compiled(self.compile().product(other.compile(), 'intersection'))
+
+    def union(self, other) -> 'DKA':
+        return DKA.from_compiled(self.compile().product(other.compile(), 'union'))
+
+    def difference(self, other) -> 'DKA':
+        return DKA.from_compiled(self.compile().product(other.compile(), 'difference'))
+
+    def complement(self) -> 'DKA':
+        return DKA.from_compiled(self.compile().complement())
+
+    def counterexample(self, other):
+        return self.compile().equivalence_counterexample(other.compile())
+
+    def is_equivalent(self, other) -> bool:
+        return self.counterexample(other) is None
+
+    def is_subset(self, other) -> bool:
+        return self.compile().inclusion_counterexample(other.compile()) is None
+
+    def minimize_table_filling(self):
+        # Former pairwise-marking implementation, kept as the baseline for
+        # lab1/bench.py. Prefer minimize().
         states = [set()] + self.states
         moves = [x for x in self.moves]
         moves_table = [[self.lang for x in states]] + [[self.lang] + moves for moves in self.moves_table]
@@ -180,290 +1345,1208 @@ class DKA(object):
         self.moves = new_moves
         self.finish_states = finish_states
 
-        self.moves_table = [[[] for x in states] for y in states]
-        for move in new_moves:
-            i = self.states.index(move['in'])
-            j = self.states.index(move['out'])
-            self.moves_table[i][j].append(move['move'])
-
 
 class NKA(object):
+    # An NKA made by from_edges keeps its moves as parallel arrays; the list
+    # of move dicts is then built on first access.
+    __slots__ = ('states', '_moves', '_edges', 'lang', 'q0', 'finish_states', '_moves_table', '_adjacency',
+                 '_eps_closures', '_closure_cache')
+
     def __init__(self, states, lang, moves, q0, finish_states):
         self.states = states
-        self.moves = moves
+        self._moves = moves
+        self._edges = None
         self.lang = lang
         self.q0 = q0
         self.finish_states = finish_states
-
-        self.moves_table = [[[] for x in states] for y in states]
-        for move in moves:
-            i = self.states.index(move['in'])
-            j = self.states.index(move['out'])
-            self.moves_table[i][j].append(move['move'])
+        self._moves_table = None
+        self._adjacency = None
+        self._eps_closures = None
+        self._closure_cache = {}
+
+    @classmethod
+    def from_edges(cls, states, lang, sources, targets, labels, q0, finish_states):
+        nka = cls(states, lang, None, q0, finish_states)
+        nka._edges = (sources, targets, labels)
+        return nka
+
+    @property
+    def moves(self):
+        if self._moves is None:
+            self._moves = [{'in': source, 'out': target, 'move': label} for source, target, label in zip(*self._edges)]
+        return self._moves
+
+    @moves.setter
+    def moves(self, value):
+        # Everything derived from the moves is built again on demand.
+        self._moves = value
+        self._edges = None
+        self._moves_table = None
+        self._adjacency = None
+        self._eps_closures = None
+        self._closure_cache = {}
+
+    def copy(self) -> 'NKA':
+        # Shares the moves but none of the derived tables and closures,
+        # which is what a process pool should receive.
+        if self._edges is not None:
+            return NKA.from_edges(self.states, self.lang, *self._edges, self.q0, self.finish_states)
+        return NKA(self.states, self.lang, self._moves, self.q0, self.finish_states)
+
+    def iter_moves(self):
+        # (source, target, label) for every move.
+        if self._edges is not None:
+            return zip(*self._edges)
+        return ((move['in'], move['out'], move['move']) for move in self.moves)
+
+    @property
+    def moves_table(self):
+        if self._moves_table is None:
+            index = {state: i for i, state in enumerate(self.states)}
+            self._moves_table = [[[] for x in self.states] for y in self.states]
+            for move in self.moves:
+                self._moves_table[index[move['in']]][index[move['out']]].append(move['move'])
+        return self._moves_table
+
+    @moves_table.setter
+    def moves_table(self, value):
+        self._moves_table = value
+
+    @property
+    def adjacency(self):
+        # state -> symbol -> targets, built once on first use.
+        if self._adjacency is None:
+            self._adjacency = {state: {} for state in self.states}
+            for source, target, label in self.iter_moves():
+                targets = self._adjacency.setdefault(source, {}).setdefault(label, [])
+                if target not in targets:
+                    targets.append(target)
+        return self._adjacency
+
+    @property
+    def eps_closures(self):
+        if self._eps_closures is None:
+            self._eps_closures = self.calc_eps_closures()
+        return self._eps_closures
 
     def is_terminal(self, state):
         return state in self.finish_states
 
-    def draw_fsm(self):
-        f = Digraph('finite_state_machine', filename='fsm.gv')
-        for state in self.states:
-            moves = [move for move in self.moves if move['in'] == state or move['out'] == state]
-            if not moves:
+    def edges(self):
+        index = {state: i for i, state in enumerate(self.states)}
+        for state, moves in self.adjacency.items():
+            targets = {}
+            for sym, outs in moves.items():
+                for target in outs:
+                    targets.setdefault(target, []).append(sym)
+            for target, group in targets.items():
+                yield index[state], index[target], merge_labels(group)
+
+    def export(self, out, format='dot', around=None, radius=1):
+        index = {state: i for i, state in enumerate(self.states)}
+        accept = [index[state] for state in self.finish_states]
+        write_fsm(out, len(self.states), index[self.q0], accept, self.edges(), format, around, radius)
+
+    def draw_fsm(self, filename='fsm.gv', view=True, around=None, radius=1):
+        self.export(filename, around=around, radius=radius)
+        if view:
+            Source.from_file(filename).view()
+
+    def calc_eps_closures(self):
+        # Tarjan's SCC search over eps moves. SCCs are completed successors
+        # first, so each closure is its SCC plus the closures of the SCCs it
+        # points to, and every state of an SCC shares one frozenset.
+        adjacency = self.adjacency
+        no_moves = {}
+        graph = {state: adjacency.get(state, no_moves).get('eps', ()) for state in adjacency}
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        closures = {}
+        for root in graph:
+            if root in index:
                 continue
-            if state in self.finish_states:
-                f.node(f'q{self.states.index(state)}', shape='doublecircle')
-            else:
-                f.node(f'q{self.states.index(state)}')
-        for move in self.moves:
-            f.edge(f"q{self.states.index(move['in'])}", f"q{self.states.index(move['out'])}", move['move'])
-        f.view()
-
-    def eps_closure(self, state):
-        closure = list([state])
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(graph[root]))]
+            while work:
+                node, successors = work[-1]
+                for succ in successors:
+                    if succ not in index:
+                        index[succ] = low[succ] = len(index)
+                        stack.append(succ)
+                        on_stack.add(succ)
+                        work.append((succ, iter(graph.get(succ, ()))))
+                        break
+                    if succ in on_stack:
+                        low[node] = min(low[node], index[succ])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] != index[node]:
+                        continue
+                    component = set()
+                    while True:
+                        state = stack.pop()
+                        on_stack.discard(state)
+                        component.add(state)
+                        if state == node:
+                            break
+                    closure = set(component)
+                    for state in component:
+                        for succ in graph.get(state, ()):
+                            if succ not in component:
+                                closure.update(closures[succ])
+                    closure = frozenset(closure)
+                    for state in component:
+                        closures[state] = closure
+        return closures
+
+    def closure(self, states, memoize=True) -> frozenset:
+        key = frozenset(states)
+        res = self._closure_cache.get(key)
+        if res is None:
+            closures = self.eps_closures
+            res = frozenset().union(*[closures.get(state, (state,)) for state in key])
+            if memoize:
+                self._closure_cache[key] = res
+        return res
 
-        q = SimpleQueue()
-        q.put(state)
-        while not q.empty():
-            s = q.get()
-            for move in self.moves:
-                if move['in'] == s and move['move'] == 'eps':
-                    if move['out'] not in closure:
-                        q.put(move['out'])
-                        closure.append(move['out'])
+    def move(self, states, t, memoize=True) -> frozenset:
+        adjacency = self.adjacency
+        targets = set()
+        for state in states:
+            moves = adjacency.get(state)
+            if moves and t in moves:
+                targets.update(moves[t])
+        return self.closure(targets, memoize)
 
-        return closure
+    def eps_closure(self, state):
+        return list(self.eps_closures.get(state, (state,)))
 
     def reachable(self, state, t):
-        reachable = list()
-
-        for move in self.moves:
-            if move['in'] == state and move['move'] == t:
-                if move['out'] not in reachable:
-                    reachable.append(move['out'])
+        return list(self.adjacency.get(state, {}).get(t, ()))
+
+
+class NKASubsets(object):
+    # Subsets of NKA states for subset construction: frozensets closed under
+    # eps moves, stepped by alphabet class. A class moves along every
+    # symbol of the NKA that contains it. The states with a '#' move accept.
+    # Without memoize, the closures of visited subsets are not kept in the
+    # NKA's cache, for callers that bound their own memory.
+    def __init__(self, nka: NKA, memoize=True):
+        self.nka = nka
+        self.memoize = memoize
+        self.classes = split_alphabet(set(nka.lang) - {'#', 'eps'})
+        self.lang = set(self.classes)
+        self.alphabet = Alphabet.from_symbols({sym: sym for sym in self.lang})
+        self.start = nka.closure([nka.q0], memoize)
+        self.finish_states = set(state for state, moves in nka.adjacency.items() if '#' in moves)
+
+    def step(self, subset, sym):
+        members = self.classes[sym][1]
+        if len(members) == 1:
+            return self.nka.move(subset, members[0], self.memoize)
+        return frozenset().union(*[self.nka.move(subset, member, self.memoize) for member in members])
+
+    def is_final(self, subset) -> bool:
+        return not self.finish_states.isdisjoint(subset)
+
+
+class PositionAutomaton(object):
+    # The positions of a syntax tree with their followpos bitsets. Subsets
+    # of positions are int bitmasks; these are the states get_dka builds.
+    # The alphabet is split into classes of chars that no position tells
+    # apart, and lang holds their labels.
+    def __init__(self, tree: Tree):
+        self.tree = tree
+        self.follow = tree.calc_attributes()
+        self.state_map = ['' for i in range(1, len(self.follow))]
+        fill_mark_map(tree, self.state_map)
+        self.start = tree.first_mask
+
+        leaf_masks = {}
+        self.finish_mask = 0
+        for pos, sym in enumerate(self.state_map, 1):
+            if sym == '#':
+                self.finish_mask |= 1 << pos
+            else:
+                leaf_masks[sym] = leaf_masks.get(sym, 0) | 1 << pos
+        self.sym_masks = {}
+        for label, (ranges, members) in split_alphabet(leaf_masks).items():
+            mask = 0
+            for sym in members:
+                mask |= leaf_masks[sym]
+            self.sym_masks[label] = mask
+        self.lang = set(self.sym_masks)
+        self.alphabet = Alphabet.from_symbols(self.sym_masks)
+
+    def step(self, mask, sym):
+        follow = self.follow
+        union = 0
+        for pos in iter_bits(mask & self.sym_masks.get(sym, 0)):
+            union |= follow[pos]
+        return union
+
+    def is_final(self, mask) -> bool:
+        return bool(mask & self.finish_mask)
+
+
+class TaggedPositions(object):
+    # Positions with tags: group g opens with tag 2g-2 and closes with tag
+    # 2g-1. A subset is a tuple of threads (position, registers) ordered by
+    # priority (earlier alternatives and more star iterations first), with
+    # one thread per position. registers[tag] names the register holding
+    # the thread's offset for tag; threads share registers, which are
+    # renamed in order of first use so that equal subsets get equal keys.
+    # step() also records, per transition, where each new register comes
+    # from: an old register, or -1 for the current offset.
+    def __init__(self, tree: Tree):
+        self.positions = PositionAutomaton(tree)
+        self.lang = self.positions.lang
+        self.groups = 0
+        self.eps = []
+        self.entries = {}
+        exits = [None] * len(self.positions.follow)
+        start = self.closure(self.link(tree, exits))
+        self.follow = {pos: self.closure(node) for pos, node in enumerate(exits) if node is not None}
+        self.tags = 2 * self.groups
+        # Tags set before the first char share one register per tag, and
+        # tags that are not set yet share an extra one holding -1.
+        unset = -1 - self.tags
+        self.start, names = self.rename([(pos, tuple(-1 - tag if tag in tags else unset for tag in range(self.tags)))
+                                         for pos, tags in start])
+        self.initial = [-1 if name == unset else 0 for name in names]
+        self.sources = {}
+
+    def link(self, tree, exits):
+        # Graph of ε moves over the tree: eps[node] lists (target, tag or
+        # None) by priority, position entries[node] is consumed at node and
+        # left through exits[position]. Fragments are built in one postorder
+        # pass as in get_nka; the start node of the tree is returned.
+        eps = self.eps
+        entries = self.entries
+
+        def new_node():
+            eps.append([])
+            return len(eps) - 1
+
+        fragments = []
+        for node in tree.postorder():
+            if node.data == 'cat':
+                right = fragments.pop()
+                left = fragments.pop()
+                eps[left[1]].append((right[0], None))
+                start, final = left[0], right[1]
+            elif node.data in ('|', '*'):
+                start, final = new_node(), new_node()
+                if node.data == '|':
+                    right = fragments.pop()
+                    left = fragments.pop()
+                    eps[start] += [(left[0], None), (right[0], None)]
+                    eps[left[1]].append((final, None))
+                    eps[right[1]].append((final, None))
+                else:
+                    inner = fragments.pop()
+                    eps[start] += [(inner[0], None), (final, None)]
+                    eps[inner[1]].append((start, None))
+            else:
+                start, final = new_node(), new_node()
+                entries[start] = node.idx
+                exits[node.idx] = final
+            for group in node.groups:
+                self.groups = max(self.groups, group)
+                outer_start, outer_final = new_node(), new_node()
+                eps[outer_start].append((start, 2 * group - 2))
+                eps[final].append((outer_final, 2 * group - 1))
+                start, final = outer_start, outer_final
+            fragments.append((start, final))
+        return fragments.pop()[0]
+
+    def closure(self, node):
+        # Positions reachable over ε moves from node with the tags on the
+        # way, in priority order; each position keeps its first path only.
+        # A star is never re-entered on one ε path, so unlike re no empty
+        # extra iteration is taken: (a*)* captures (0, 2) on 'aa', not (2, 2),
+        # and None on '', not (0, 0).
+        eps = self.eps
+        entries = self.entries
+        res = []
+        seen = set()
+        stack = [(node, ())]
+        while stack:
+            node, tags = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            if node in entries:
+                res.append((entries[node], frozenset(tags)))
+                continue
+            for target, tag in reversed(eps[node]):
+                stack.append((target, tags if tag is None else tags + (tag,)))
+        return res
 
-        return reachable
+    @staticmethod
+    def rename(threads):
+        # (key, names): names[i] is the register renamed to i.
+        index = {}
+        names = []
+        key = []
+        for pos, registers in threads:
+            for reg in registers:
+                if reg not in index:
+                    index[reg] = len(names)
+                    names.append(reg)
+            key.append((pos, tuple(index[reg] for reg in registers)))
+        return tuple(key), names
+
+    def step(self, key, sym):
+        mask = self.positions.sym_masks.get(sym, 0)
+        threads = []
+        seen = set()
+        for pos, registers in key:
+            if not mask >> pos & 1:
+                continue
+            for target, set_tags in self.follow[pos]:
+                if target not in seen:
+                    seen.add(target)
+                    # A tag set on this move gets one new register, -1 - tag.
+                    threads.append((target, tuple(-1 - tag if tag in set_tags else reg
+                                                  for tag, reg in enumerate(registers))))
+        target, names = self.rename(threads)
+        self.sources[key, sym] = tuple(max(name, -1) for name in names)
+        return target
+
+    def is_final(self, key) -> bool:
+        finish_mask = self.positions.finish_mask
+        return any(finish_mask >> pos & 1 for pos, registers in key)
+
+
+class SubsetBuilder(object):
+    # Subset construction over hashable subset keys (int bitmasks of
+    # positions or frozensets of NKA states). Keys get integer ids in
+    # discovery order and unexplored ids wait in a deque, so every lookup is
+    # a single dict probe. An empty subset is the dead sink.
+    def __init__(self, lang, step, is_final):
+        self.symbols = {sym: i for i, sym in enumerate(sorted(lang))}
+        self.step = step
+        self.is_final = is_final
+
+    def build(self, start, stats=None):
+        step = self.step
+        syms = list(self.symbols)
+        width = len(syms)
+        index = {start: 0}
+        keys = [start]
+        rows = []
+        work = deque([0])
+        while work:
+            key = keys[work.popleft()]
+            row = [-1] * width
+            for j, sym in enumerate(syms):
+                target = step(key, sym)
+                if not target:
+                    continue
+                idx = index.get(target)
+                if idx is None:
+                    idx = index[target] = len(keys)
+                    keys.append(target)
+                    work.append(idx)
+                row[j] = idx
+            rows.append(row)
+        return self.table(keys, rows, stats)
+
+    def table(self, keys, rows, stats=None):
+        # (CompiledDKA, keys) from rows of target ids, -1 for the dead sink.
+        width = len(self.symbols)
+        dead = len(keys)
+        delta = array('i', [dead if target == -1 else target for row in rows for target in row])
+        delta += array('i', [dead]) * width
+        accept = bytearray(dead + 1)
+        for i, key in enumerate(keys):
+            if self.is_final(key):
+                accept[i] = 1
+        if stats is not None:
+            stats.update(**self.describe(keys, rows))
+        return CompiledDKA(dict(self.symbols), delta, accept, 0), keys
+
+    @staticmethod
+    def describe(keys, rows):
+        # Counters for BuildStats, worked out after the fact so the loop in
+        # build() stays as it is. Ids are handed out in BFS order, so when
+        # row i has been expanded the deque holds every id discovered so far
+        # past i.
+        discovered = 1
+        worklist_peak = 1
+        for i, row in enumerate(rows):
+            discovered = max(discovered, max(row, default=-1) + 1)
+            worklist_peak = max(worklist_peak, discovered - i - 1)
+        return {
+            'states': len(keys),
+            'transitions': sum(target != -1 for row in rows for target in row),
+            'peak_subset': max(bin(key).count('1') if isinstance(key, int) else len(key) for key in keys),
+            'worklist_peak': worklist_peak,
+        }
+
+
+class SubsetMatcher(ABC):
+    # DKA's matching API on top of run(), which returns the subset key the
+    # string ends in: falsy once no move is possible, None for a symbol
+    # outside lang.
+    @abstractmethod
+    def run(self, string, on_state=None):
+        pass
+
+    @abstractmethod
+    def is_final(self, key) -> bool:
+        pass
+
+    def fullmatch(self, string) -> bool:
+        key = self.run(string)
+        return bool(key) and self.is_final(key)
+
+    def match(self, string) -> bool:
+        key = self.run(string, self.is_final)
+        return bool(key) and self.is_final(key)
 
+    def eval(self, string):
+        for char in string:
+            if self.alphabet[char] is None:
+                print("Wrong symbol detected")
+                return False
+        key = self.run(string)
+        if not key:
+            print("String can not be evaluated")
+            return False
+        if not self.is_final(key):
+            print("String finish in non-finish state")
+            return False
+        print("String evaluated successfully")
+        return True
 
-regexp_ops_sym = ["|", "*"]
+    def eval_many(self, strings, batch_size=65536):
+        return array('B', [self.fullmatch(string) for string in strings])
+
+
+class LazyDKA(SubsetMatcher):
+    # Determinizes on demand: a DKA state (a subset key, see SubsetBuilder)
+    # and its moves are built when input first reaches them and kept in an
+    # LRU cache of at most cache_size states. If a string keeps missing a
+    # full cache, the rest of it is run as a plain subset simulation.
+    thrash_window = 256
+
+    def __init__(self, lang, start, step, is_final, cache_size=1024):
+        self.lang = set(lang)
+        self.alphabet = Alphabet.from_symbols({sym: sym for sym in self.lang})
+        self.start = start
+        self.step_subset = step
+        self.final_subset = is_final
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'fallbacks': 0}
+
+    @classmethod
+    def from_nka(cls, nka: NKA, cache_size=1024):
+        # Subsets are not memoized in the NKA, so cache_size bounds memory.
+        subsets = NKASubsets(nka, memoize=False)
+        return cls(subsets.lang, subsets.start, subsets.step, subsets.is_final, cache_size)
+
+    def is_final(self, key) -> bool:
+        return bool(self.final_subset(key))
+
+    def step(self, key, sym):
+        cache = self.cache
+        row = cache.get(key)
+        if row is None:
+            row = cache[key] = {}
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+                self.stats['evictions'] += 1
+        else:
+            cache.move_to_end(key)
+        target = row.get(sym)
+        if target is None:
+            target = row[sym] = self.step_subset(key, sym)
+            self.stats['misses'] += 1
+        else:
+            self.stats['hits'] += 1
+        return target
+
+    def run(self, string, on_state=None):
+        key = self.start
+        if on_state and on_state(key):
+            return key
+        stats = self.stats
+        alphabet = self.alphabet
+        step = self.step
+        window_misses = stats['misses']
+        for i, char in enumerate(string, 1):
+            sym = alphabet[char]
+            if sym is None:
+                return None
+            key = step(key, sym)
+            if not key:
+                return key
+            if on_state and on_state(key):
+                return key
+            if i % self.thrash_window == 0:
+                misses = stats['misses'] - window_misses
+                window_misses = stats['misses']
+                if misses * 2 > self.thrash_window and len(self.cache) >= self.cache_size:
+                    stats['fallbacks'] += 1
+                    step = self.step_subset
+        return key
+
+
+class GlushkovMatcher(SubsetMatcher):
+    # Simulates the position automaton directly: the active positions are
+    # one int and a step is (active & char mask) pushed through followpos.
+    # followpos is pre-ORed for every byte of positions, so a step costs
+    # one table lookup per 8 positions instead of one per position.
+    def __init__(self, positions: PositionAutomaton):
+        self.lang = set(positions.lang)
+        self.alphabet = positions.alphabet
+        self.start = positions.start
+        self.sym_masks = positions.sym_masks
+        self.finish_mask = positions.finish_mask
+        follow = positions.follow + [0] * (-len(positions.follow) % 8)
+        self.follow_chunks = []
+        for base in range(0, len(follow), 8):
+            table = [0] * 256
+            for byte in range(1, 256):
+                low = byte & -byte
+                table[byte] = table[byte ^ low] | follow[base + low.bit_length() - 1]
+            self.follow_chunks.append(table)
+
+    def step(self, active, sym):
+        active &= self.sym_masks.get(sym, 0)
+        res = 0
+        for table in self.follow_chunks:
+            if not active:
+                break
+            byte = active & 255
+            if byte:
+                res |= table[byte]
+            active >>= 8
+        return res
 
+    def run(self, string, on_state=None):
+        active = self.start
+        if on_state and on_state(active):
+            return active
+        alphabet = self.alphabet
+        chunks = self.follow_chunks
+        for char in string:
+            mask = alphabet[char]
+            if mask is None:
+                return None
+            active &= mask
+            res = 0
+            for table in chunks:
+                if not active:
+                    break
+                byte = active & 255
+                if byte:
+                    res |= table[byte]
+                active >>= 8
+            active = res
+            if not active:
+                return active
+            if on_state and on_state(active):
+                return active
+        return active
+
+    def is_final(self, active) -> bool:
+        return bool(active & self.finish_mask)
+
+
+def get_glushkov_matcher(regexp: str) -> GlushkovMatcher:
+    return GlushkovMatcher(PositionAutomaton(get_syntax_tree(regexp)))
+
+
+class PatternSet(object):
+    # One DKA for several regexps: pattern i is followed by its own '#'
+    # position, and tags[state] has bit i set when that state accepts
+    # pattern i. Overlaps are resolved by the order of the patterns.
+    def __init__(self, regexps, compiled: CompiledDKA, tags):
+        self.regexps = regexps
+        self.compiled = compiled
+        self.tags = tags
+
+    def fullmatch_all(self, string):
+        return list(iter_bits(self.tags[self.compiled.run(string)]))
+
+    def fullmatch(self, string):
+        tag = self.tags[self.compiled.run(string)]
+        return (tag & -tag).bit_length() - 1 if tag else None
+
+    def match(self, string):
+        # Longest matching prefix first, then pattern order, as a lexer does.
+        compiled = self.compiled
+        tags = self.tags
+        state = compiled.start
+        best = (tags[state], 0)
+        for end, char in enumerate(string, 1):
+            state = compiled.step(state, char)
+            if state == compiled.dead:
+                break
+            if tags[state]:
+                best = (tags[state], end)
+        tag, end = best
+        if not tag:
+            return None
+        return (tag & -tag).bit_length() - 1, end
+
+
+class Prefilter(object):
+    # Literals of which every match contains at least one, see
+    # required_literals. Inputs without any of them are rejected with
+    # str.find / bytes.find before the DKA runs; with no literals every
+    # input passes. `checked` and `skipped` count the inputs looked at and
+    # rejected.
+    __slots__ = ('literals', 'encoded', 'checked', 'skipped')
+
+    def __init__(self, literals=()):
+        self.literals = tuple(literals)
+        # Bytes are read as latin-1 chars (see CompiledDKA.byte_table), so
+        # literals with other chars never occur in them.
+        self.encoded = tuple(literal.encode('latin-1') for literal in self.literals
+                             if max(map(ord, literal)) < 256)
+        self.checked = 0
+        self.skipped = 0
+
+    def __bool__(self):
+        return bool(self.literals)
+
+    def may_match(self, data) -> bool:
+        # data is a str or anything with a bytes find(), such as bytes,
+        # bytearray or mmap.
+        if not self.literals:
+            return True
+        self.checked += 1
+        for literal in self.literals if isinstance(data, str) else self.encoded:
+            if data.find(literal) >= 0:
+                return True
+        self.skipped += 1
+        return False
 
-def check_brackets(regexp: str) -> bool:
-    group_deep = 0
-    for i in range(len(regexp)):
-        if regexp[i] == '(':
-            group_deep += 1
-        elif regexp[i] == ')':
-            if group_deep == 0:
-                return False
-            group_deep -= 1
-
-    return group_deep == 0
-
-
-def remove_brackets(regexp: str) -> str:
-    if regexp[0] == '(' and regexp[-1] == ')':
-        if check_brackets(regexp[1:-1]):
-            return remove_brackets(regexp[1:-1])
-    return regexp
-
-
-def find_outter_op(regexp) -> int:
-    level = 0
-    ops_idx = {"or": 0, "cat": 0, "star": 0}
-    prev = None
-    for i in range(len(regexp)):
-        if level == 0:
-            if regexp[i] == '*':
-                ops_idx['star'] = i
-            elif regexp[i] == '|':
-                ops_idx['or'] = i
-            elif prev and prev != '|' and prev != '(':
-                ops_idx['cat'] = i
-        if regexp[i] == '(':
-            level += 1
-        elif regexp[i] == ')':
-            level -= 1
-        prev = regexp[i]
-
-    if ops_idx['or']:
-        return ops_idx['or']
-    if ops_idx['cat']:
-        return ops_idx['cat']
-    return ops_idx['star']
+    def stats(self) -> dict:
+        checked = self.checked
+        return {'literals': list(self.literals), 'checked': checked, 'skipped': self.skipped,
+                'hits': checked - self.skipped,
+                'hit_rate': (checked - self.skipped) / checked if checked else 0.0,
+                'skip_rate': self.skipped / checked if checked else 0.0}
+
+
+class TaggedDKA(object):
+    # A DKA over the thread lists of TaggedPositions, so that captures come
+    # out of the same scan that matches. Most moves keep every register in
+    # place and only set some of them to the offset, listed in
+    # sets[state * width + sym]; moves that rename registers have the
+    # sources of all new registers in copies[...] instead (None
+    # otherwise). final[state] holds the registers of the accepting
+    # thread's tags, or None. Tags make states that accept the same
+    # strings differ, so the automaton is not minimized.
+    __slots__ = ('compiled', 'groups', 'sets', 'copies', 'initial', 'final')
+
+    def __init__(self, compiled: CompiledDKA, groups, sets, copies, initial, final):
+        self.compiled = compiled
+        self.groups = groups
+        self.sets = sets
+        self.copies = copies
+        self.initial = initial
+        self.final = final
+
+    def __len__(self):
+        return len(self.compiled)
+
+    def fullmatch(self, string):
+        # Spans of groups 1..groups as (start, end), None for groups that
+        # did not take part, or None if string does not match.
+        compiled = self.compiled
+        delta = compiled.delta
+        lookup = compiled.lookup
+        width = compiled.width
+        dead = compiled.dead
+        sets = self.sets
+        copies = self.copies
+        state = compiled.start
+        regs = list(self.initial)
+        for i, char in enumerate(string, 1):
+            sym = lookup[char]
+            if sym is None:
+                return None
+            move = state * width + sym
+            state = delta[move]
+            if state == dead:
+                return None
+            sources = copies[move]
+            if sources is not None:
+                regs = [i if src < 0 else regs[src] for src in sources]
+            else:
+                for reg in sets[move]:
+                    regs[reg] = i
+        final = self.final[state]
+        if final is None:
+            return None
+        spans = []
+        for tag in range(0, 2 * self.groups, 2):
+            start, end = regs[final[tag]], regs[final[tag + 1]]
+            spans.append((start, end) if start >= 0 and end >= 0 else None)
+        return tuple(spans)
+
+    def groups_of(self, string):
+        # Like re.fullmatch(...).groups(): the captured substrings.
+        spans = self.fullmatch(string)
+        if spans is None:
+            return None
+        return tuple(string[span[0]:span[1]] if span else None for span in spans)
+
+
+def compile_set(regexps: List[str], minimize=True) -> PatternSet:
+    if not regexps:
+        raise ValueError("compile_set needs at least one regexp")
+    tree = None
+    markers = []
+    for regexp in regexps:
+        if '#' in regexp:
+            raise ValueError(f"'#' is reserved for end markers: {regexp}")
+        marker = Tree('#')
+        markers.append(marker)
+        branch = Tree('cat', get_syntax_tree(regexp), marker)
+        tree = branch if tree is None else Tree('|', tree, branch)
+
+    positions = PositionAutomaton(tree)
+    compiled, keys = SubsetBuilder(positions.lang, positions.step, positions.is_final).build(positions.start)
+    marker_tags = [(1 << marker.idx, 1 << i) for i, marker in enumerate(markers)]
+    tags = [0] * len(compiled)
+    for i, key in enumerate(keys):
+        for bit, tag in marker_tags:
+            if key & bit:
+                tags[i] |= tag
+
+    if minimize:
+        minimized, mapping = compiled.minimize(tags)
+        new_tags = [0] * len(minimized)
+        for old, new in enumerate(mapping):
+            if new is not None:
+                new_tags[new] = tags[old]
+        compiled, tags = minimized, new_tags
+    return PatternSet(list(regexps), compiled, tags)
+
+
+regexp_ops_priority = {"|": 1, "cat": 2}
+# Literal sets of required_literals hold at most this many strings of at
+# most MAX_LITERAL_LENGTH chars, and char classes of at most
+# MAX_CLASS_LITERALS chars count as literals.
+MAX_LITERALS = 16
+MAX_LITERAL_LENGTH = 64
+MAX_CLASS_LITERALS = 4
+
+
+def find_class_end(regexp: str, start) -> int:
+    i = start
+    while i < len(regexp) and regexp[i] != ']':
+        i += 2 if regexp[i] == '\\' else 1
+    if i >= len(regexp):
+        raise ValueError("Unbalanced '[' in regexp")
+    if i == start or regexp[start:i] == '^':
+        raise ValueError("Empty character class in regexp")
+    return i
+
+
+def parse_char_class(text: str):
+    # '[a-z0-9_]' or '[^...]' -> sorted, merged (lo, hi) code point ranges;
+    # '\\' escapes the next char.
+    body = text[1:-1]
+    negate = body.startswith('^')
+    if negate:
+        body = body[1:]
+    chars = []
+    i = 0
+    while i < len(body):
+        escaped = body[i] == '\\' and i + 1 < len(body)
+        i += escaped
+        chars.append((body[i], escaped))
+        i += 1
+    ranges = []
+    i = 0
+    while i < len(chars):
+        if i + 2 < len(chars) and chars[i + 1] == ('-', False):
+            lo, hi = ord(chars[i][0]), ord(chars[i + 2][0])
+            if lo > hi:
+                raise ValueError(f"Bad range {chars[i][0]}-{chars[i + 2][0]} in {text}")
+            ranges.append((lo, hi))
+            i += 3
+        else:
+            ranges.append((ord(chars[i][0]), ord(chars[i][0])))
+            i += 1
+
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(hi, merged[-1][1]))
+        else:
+            merged.append((lo, hi))
+    if negate:
+        merged = complement_ranges(merged)
+    return tuple(merged)
+
+
+def complement_ranges(ranges):
+    # Sorted (lo, hi) code point ranges -> the ranges of all other chars.
+    complement = []
+    prev = 0
+    for lo, hi in ranges:
+        if lo > prev:
+            complement.append((prev, lo - 1))
+        prev = max(prev, hi + 1)
+    if prev <= sys.maxunicode:
+        complement.append((prev, sys.maxunicode))
+    return complement
+
+
+def char_ranges(symbol: str):
+    if len(symbol) > 1 and symbol[0] == '[':
+        return parse_char_class(symbol)
+    return ((ord(symbol), ord(symbol)),)
+
+
+def class_label(ranges) -> str:
+    if len(ranges) == 1 and ranges[0][0] == ranges[0][1]:
+        return chr(ranges[0][0])
+
+    def escape(code):
+        char = chr(code)
+        return '\\' + char if char in '\\]-^' else char
+
+    return '[' + ''.join(escape(lo) if lo == hi else f'{escape(lo)}-{escape(hi)}' for lo, hi in ranges) + ']'
+
+
+def split_alphabet(symbols):
+    # Splits the chars of symbols (plain chars or class texts) into classes
+    # that every symbol either fully contains or misses. Works on range
+    # boundaries only, so the cost does not depend on class widths. Returns
+    # {label: (ranges, symbols containing the class)}.
+    symbols = sorted(set(symbols))
+    events = {}
+    for i, symbol in enumerate(symbols):
+        for lo, hi in char_ranges(symbol):
+            events[lo] = events.get(lo, 0) ^ (1 << i)
+            events[hi + 1] = events.get(hi + 1, 0) ^ (1 << i)
+    points = sorted(events)
+    signatures = {}
+    active = 0
+    for point, next_point in zip(points, points[1:]):
+        active ^= events[point]
+        if active:
+            signatures.setdefault(active, []).append((point, next_point - 1))
+    classes = {}
+    for signature, ranges in signatures.items():
+        classes[class_label(ranges)] = (tuple(ranges), [symbols[i] for i in iter_bits(signature)])
+    return classes
+
+
+def literal_set(strings):
+    # None for sets that do not help a prefilter: unknown, too big, or
+    # containing '' (which every input contains).
+    if strings is None or not strings or '' in strings or len(strings) > MAX_LITERALS:
+        return None
+    return strings
+
+
+def cross_literals(left, right):
+    if left is None or right is None or len(left) * len(right) > MAX_LITERALS:
+        return None
+    return frozenset(x + y for x in left for y in right)
+
+
+def clip_literals(strings, keep_end=False):
+    # Cuts strings to their first (or last) MAX_LITERAL_LENGTH chars, which
+    # keeps them prefixes (or suffixes) and factors of the same strings.
+    if strings is None:
+        return None
+    if keep_end:
+        return frozenset(x[-MAX_LITERAL_LENGTH:] for x in strings)
+    return frozenset(x[:MAX_LITERAL_LENGTH] for x in strings)
+
+
+def literal_score(strings):
+    # Longer literals are rarer and each one costs a find() of its own.
+    return min(map(len, strings)) / len(strings)
+
+
+def required_literals(tree: Tree) -> List[str]:
+    # Literals of which every string of the tree's language contains at
+    # least one, or [] if there is no such set. Every node gets (exact,
+    # prefixes, suffixes, factors): its language if that is a small set
+    # of strings, and sets every string starts with, ends with or
+    # contains one of. None stands for unknown. '#' end markers match ''.
+    # Strings are kept at most MAX_LITERAL_LENGTH chars long, so long
+    # literal runs still take linear time.
+    results = []
+    for node in tree.postorder():
+        if node.data == '*':
+            results.pop()
+            results.append((None, None, None, None))
+            continue
+        if node.data == '|':
+            right = results.pop()
+            left = results.pop()
+            exact = None
+            if left[0] is not None and right[0] is not None and len(left[0] | right[0]) <= MAX_LITERALS:
+                exact = left[0] | right[0]
+            results.append((exact,) + tuple(literal_set(x | y) if x and y else None
+                                            for x, y in zip(left[1:], right[1:])))
+            continue
+        if node.data == 'cat':
+            right = results.pop()
+            left = results.pop()
+            exact = cross_literals(left[0], right[0])
+            if exact is not None and max(map(len, exact)) > MAX_LITERAL_LENGTH:
+                exact = None
+            left_end = left[0] if left[0] is not None else left[2] or frozenset([''])
+            right_start = right[0] if right[0] is not None else right[1] or frozenset([''])
+            prefixes = left[1]
+            if left[0] is not None:
+                prefixes = literal_set(clip_literals(cross_literals(left[0], right_start))) or literal_set(left[0])
+            suffixes = right[2]
+            if right[0] is not None:
+                suffixes = (literal_set(clip_literals(cross_literals(left_end, right[0]), keep_end=True))
+                            or literal_set(right[0]))
+            candidates = [left[3], right[3], prefixes, suffixes, literal_set(exact),
+                          literal_set(clip_literals(cross_literals(left_end, right_start)))]
+            candidates = [x for x in candidates if x is not None]
+            factors = max(candidates, key=literal_score) if candidates else None
+            results.append((exact, prefixes, suffixes, factors))
+            continue
+        exact = None
+        if node.data == '#':
+            exact = frozenset([''])
+        else:
+            ranges = char_ranges(node.data)
+            if sum(hi - lo + 1 for lo, hi in ranges) <= MAX_CLASS_LITERALS:
+                exact = frozenset(chr(code) for lo, hi in ranges for code in range(lo, hi + 1))
+        results.append((exact,) + (literal_set(exact),) * 3)
+    factors = results.pop()[3]
+    return sorted(factors) if factors else []
 
 
 def get_moves(regexp: str) -> Set[str]:
-    filter_list = ['(', ')', '*', '|', '#']
-    return set([i for i in regexp if i not in filter_list])
+    leaves = [node.data for node in get_syntax_tree(regexp).postorder() if not (node.left or node.right)]
+    return set(split_alphabet(x for x in leaves if x != '#'))
 
 
 def get_syntax_tree(regexp: str) -> Tree:
-    regexp = remove_brackets(regexp)
-    if len(regexp) == 1:
-        return Tree(regexp)
-    op_idx = find_outter_op(regexp)
-    if regexp[op_idx] == '|':
-        left = get_syntax_tree(regexp[0:op_idx])
-        right = get_syntax_tree(regexp[op_idx+1::])
-        return Tree('|', left, right)
-    elif regexp[op_idx] == '*':
-        left = get_syntax_tree(regexp[0:op_idx])
-        return Tree('*', left)
-    else:
-        left = get_syntax_tree(regexp[0:op_idx])
-        right = get_syntax_tree(regexp[op_idx::])
-        return Tree('cat', left, right)
-
-
-def get_unmarked(states: List[dict]) -> int:
-    for i in range(len(states)):
-        if not states[i]['marked']:
-            return i
-    return -1
+    # Shunting-yard over the characters of regexp: '*' binds tighter than
+    # the implicit concatenation, which binds tighter than '|'; both binary
+    # operators are left associative. A character class such as [a-z0-9]
+    # becomes a single leaf holding its text. Every '(' opens a capture
+    # group, numbered from 1 as in the re module, and the group's number is
+    # added to the groups of the node it encloses.
+    operands = []
+    ops = []
+    open_groups = []
+    group_count = 0
+
+    def reduce():
+        op = ops.pop()
+        if len(operands) < 2:
+            raise ValueError(f"Missing operand for '{'|' if op == '|' else 'concatenation'}' in regexp")
+        right = operands.pop()
+        left = operands.pop()
+        operands.append(Tree(op, left, right))
+
+    def push_op(op, priority):
+        while ops and ops[-1] != '(' and regexp_ops_priority[ops[-1]] >= priority:
+            reduce()
+        ops.append(op)
+
+    after_operand = False
+    i = 0
+    while i < len(regexp):
+        char = regexp[i]
+        i += 1
+        if char == '[':
+            end = find_class_end(regexp, i)
+            if after_operand:
+                push_op('cat', regexp_ops_priority['cat'])
+            operands.append(Tree(regexp[i - 1:end + 1]))
+            after_operand = True
+            i = end + 1
+        elif char == '(':
+            if after_operand:
+                push_op('cat', regexp_ops_priority['cat'])
+            ops.append(char)
+            group_count += 1
+            open_groups.append(group_count)
+            after_operand = False
+        elif char == ')':
+            if not after_operand:
+                raise ValueError("Empty group or missing operand before ')' in regexp")
+            while ops and ops[-1] != '(':
+                reduce()
+            if not ops:
+                raise ValueError("Unbalanced ')' in regexp")
+            ops.pop()
+            operands[-1].groups += (open_groups.pop(),)
+        elif char == '*':
+            if not after_operand:
+                raise ValueError("Missing operand for '*' in regexp")
+            operands.append(Tree('*', operands.pop()))
+        elif char == '|':
+            if not after_operand:
+                raise ValueError("Missing operand for '|' in regexp")
+            push_op(char, regexp_ops_priority['|'])
+            after_operand = False
+        else:
+            if after_operand:
+                push_op('cat', regexp_ops_priority['cat'])
+            operands.append(Tree(char))
+            after_operand = True
+
+    if not after_operand:
+        raise ValueError("Regexp is empty or ends with an operator")
+    while ops:
+        if ops[-1] == '(':
+            raise ValueError("Unbalanced '(' in regexp")
+        reduce()
+    return operands[0]
 
 
 def fill_mark_map(tree: Tree, arr: List[str]):
-    if not tree.left and not tree.right:
-        arr[tree.idx-1] = tree.data
-        return
-    if tree.left:
-        fill_mark_map(tree.left, arr)
-    if tree.right:
-        fill_mark_map(tree.right, arr)
-
-
-def get_dka(regexp: str) -> DKA:
-    tree = get_syntax_tree(regexp)
-    lang = get_moves(regexp)
-    count = tree.set_idx()
-    followpos_table = [tree.followpos(i) for i in range(1, count)]
-    state_map = ['' for i in range(1, count)]
-    fill_mark_map(tree, state_map)
-    q0 = {'state': set(tree.firstpos()), 'marked': False}
-    d_state = [q0]
-    d_tran = []
-    unmarked_idx = get_unmarked(d_state)
-
-    while unmarked_idx > -1:
-        d_state[unmarked_idx]['marked'] = True
-
-        for move in lang:
-            union = set()
-
-            for i in d_state[unmarked_idx]['state']:
-                if state_map[i - 1] == move:
-                    union.update(followpos_table[i-1])
-
-            found = False
-            for state in d_state:
-                if state['state'] == union:
-                    found = True
-
-            if not found:
-                d_state.append({'state': union, 'marked': False})
-            if union:
-                d_tran.append({'in': d_state[unmarked_idx]['state'], 'out': union, 'move': move})
-
-        unmarked_idx = get_unmarked(d_state)
-
-    finish_states = []
-    for state in d_state:
-        found = False
-        for pos in state['state']:
-            if state_map[pos-1] == '#':
-                found = True
-        if found:
-            finish_states.append(state)
-
-    return DKA([state['state'] for state in d_state], lang, d_tran, q0['state'],
-               [state['state'] for state in finish_states])
-
-
-def get_nka(tree: Tree, last_q_num):
-    if tree.data not in regexp_ops_sym + ['cat']:
-        start_q = last_q_num
-        fin_q = last_q_num + 1
-        states = [start_q, fin_q]
-        move = {'in': start_q, 'out': fin_q, 'move': tree.data}
-        return NKA(states, [tree.data], [move], start_q, [fin_q]), last_q_num + 2
-    elif tree.data == '|':
-        left_nka, last_q_num = get_nka(tree.left, last_q_num)
-        right_nka, last_q_num = get_nka(tree.right, last_q_num)
-        start_q = last_q_num
-        fin_q = last_q_num + 1
-        states = left_nka.states + right_nka.states + [start_q, fin_q]
-        lang = set(left_nka.lang + right_nka.lang)
-        moves = [{'in': start_q, 'out': left_nka.q0, 'move': 'eps'},
-                 {'in': start_q, 'out': right_nka.q0, 'move': 'eps'},
-                 {'in': left_nka.finish_states[0], 'out': fin_q, 'move': 'eps'},
-                 {'in': right_nka.finish_states[0], 'out': fin_q, 'move': 'eps'}] + left_nka.moves + right_nka.moves
-        return NKA(states, lang, moves, start_q, [fin_q]), last_q_num + 2
-    elif tree.data == 'cat':
-        left_nka, last_q_num = get_nka(tree.left, last_q_num)
-        right_nka, last_q_num = get_nka(tree.right, last_q_num)
-        states = left_nka.states + right_nka.states[1:]
-        lang = set(left_nka.lang)
-        lang.union(set(right_nka.lang))
-        moves = left_nka.moves + right_nka.moves
-        for move in moves:
-            if move['in'] == right_nka.states[0]:
-                move['in'] = left_nka.states[-1]
-            if move['out'] == right_nka.states[0]:
-                move['out'] = left_nka.states[-1]
-        return NKA(states, lang, moves, left_nka.q0, [right_nka.finish_states[0]]), last_q_num
-    elif tree.data == '*':
-        left_nka, last_q_num = get_nka(tree.left, last_q_num)
-        start_q = last_q_num
-        fin_q = last_q_num + 1
-        states = [start_q] + left_nka.states + [fin_q]
-        lang = left_nka.lang
-        moves = [{'in': start_q, 'out': left_nka.q0, 'move': 'eps'},
-                 {'in': left_nka.finish_states[0], 'out': fin_q, 'move': 'eps'},
-                 {'in': left_nka.finish_states[0], 'out': left_nka.q0, 'move': 'eps'},
-                 {'in': start_q, 'out': fin_q, 'move': 'eps'}] + left_nka.moves
-        return NKA(states, lang, moves, start_q, [fin_q]), last_q_num + 2
-
-
-def nka_to_dka(nka: NKA) -> DKA:
-    q0 = {'state': set(nka.eps_closure(nka.q0)), 'marked': False}
-    d_state = [q0]
-    d_tran = []
-    unmarked_idx = get_unmarked(d_state)
-
-    while unmarked_idx > -1:
-        d_state[unmarked_idx]['marked'] = True
-
-        for sym in nka.lang:
-            union = set()
-
-            for i in d_state[unmarked_idx]['state']:
-                reachable = nka.reachable(i, sym)
-                for j in reachable:
-                    union.update(nka.eps_closure(j))
-
-            found = False
-            for state in d_state:
-                if state['state'] == union:
-                    found = True
-
-            if not found:
-                d_state.append({'state': union, 'marked': False})
-            if union:
-                d_tran.append({'in': d_state[unmarked_idx]['state'], 'out': union, 'move': sym})
-
-        unmarked_idx = get_unmarked(d_state)
-
-    old_finish_states = []
-    for state in nka.states:
-        reachable = nka.reachable(state, '#')
-        if reachable:
-            old_finish_states.append(state)
-
-    finish_states = []
-    for state in d_state:
-        for i in state['state']:
-            if i in old_finish_states and state not in finish_states:
-                finish_states.append(state)
-
-    return DKA([state['state'] for state in d_state], nka.lang, d_tran, q0['state'],
-               [state['state'] for state in finish_states])
+    for node in tree.postorder():
+        if not node.left and not node.right:
+            arr[node.idx-1] = node.data
+
+
+def get_dka(regexp: str, stats: BuildStats = None) -> DKA:
+    with build_phase(stats, 'parse'):
+        tree = get_syntax_tree(regexp)
+        literals = required_literals(tree)
+    with build_phase(stats, 'attributes'):
+        positions = PositionAutomaton(tree)
+    with build_phase(stats, 'subsets'):
+        builder = SubsetBuilder(positions.lang, positions.step, positions.is_final)
+        compiled, keys = builder.build(positions.start, stats)
+    with build_phase(stats, 'views'):
+        dka = DKA.from_compiled(compiled, keys, mask_to_set)
+        dka.prefilter = Prefilter(literals)
+        return dka
+
+
+def get_lazy_dka(regexp: str, cache_size=1024) -> LazyDKA:
+    positions = PositionAutomaton(get_syntax_tree(regexp))
+    return LazyDKA(positions.lang, positions.start, positions.step, positions.is_final, cache_size)
+
+
+def get_tagged_dka(regexp: str, stats: BuildStats = None) -> TaggedDKA:
+    # Captures of regexp's groups with the re module's rules: leftmost
+    # alternatives and greedy stars win, a repeated group keeps its last
+    # iteration. One exception: re ends a star whose body can match '' with
+    # an extra empty iteration, which is never taken here (see
+    # TaggedPositions.closure). Groups in such a body keep their last
+    # non-empty iteration, or None without one: ((a)*)* gives (None, None)
+    # on '' where re gives ((0, 0), None).
+    if '#' in regexp:
+        raise ValueError(f"'#' is reserved for the end marker: {regexp}")
+    with build_phase(stats, 'parse'):
+        tree = Tree('cat', get_syntax_tree(regexp), Tree('#'))
+    with build_phase(stats, 'tags'):
+        tagged = TaggedPositions(tree)
+    with build_phase(stats, 'subsets'):
+        builder = SubsetBuilder(tagged.lang, tagged.step, tagged.is_final)
+        compiled, keys = builder.build(tagged.start, stats)
+    syms = sorted(compiled.symbols, key=compiled.symbols.get)
+    sets = [()] * len(compiled.delta)
+    copies = [None] * len(compiled.delta)
+    shared = {}
+    for state, key in enumerate(keys):
+        count = len(set(reg for pos, registers in key for reg in registers))
+        for column, sym in enumerate(syms):
+            sources = tagged.sources.get((key, sym))
+            if sources is None:
+                continue
+            move = state * compiled.width + column
+            # In place when no register is renamed; the register list is
+            # never shorter than the current state needs.
+            if len(sources) <= count and all(src < 0 or src == reg for reg, src in enumerate(sources)):
+                changed = tuple(reg for reg, src in enumerate(sources) if src < 0)
+                sets[move] = shared.setdefault(changed, changed)
+            else:
+                copies[move] = shared.setdefault(sources, sources)
+    finish_mask = tagged.positions.finish_mask
+    final = [next((registers for pos, registers in key if finish_mask >> pos & 1), None) for key in keys]
+    return TaggedDKA(compiled, tagged.groups, sets, copies, tagged.initial, final + [None])
+
+
+def get_nka(tree: Tree, last_q_num, stats: BuildStats = None):
+    # Thompson's construction in one postorder pass. Every fragment is a
+    # (start, final) pair on a stack and all moves go to shared parallel
+    # arrays. 'cat' glues the right fragment's start onto the left final
+    # through `alias`, resolved once at the end instead of rewriting moves.
+    with build_phase(stats, 'thompson'):
+        sources = array('i')
+        targets = array('i')
+        labels = []
+        alias = {}
+        lang = set()
+        fragments = []
+        count = last_q_num
+
+        def add(source, target, label='eps'):
+            sources.append(source)
+            targets.append(target)
+            labels.append(label)
+
+        for node in tree.postorder():
+            if node.data == 'cat':
+                right = fragments.pop()
+                left = fragments.pop()
+                alias[right[0]] = left[1]
+                fragments.append((left[0], right[1]))
+                continue
+            start, final = count, count + 1
+            count += 2
+            if node.data == '|':
+                right = fragments.pop()
+                left = fragments.pop()
+                add(start, left[0])
+                add(start, right[0])
+                add(left[1], final)
+                add(right[1], final)
+            elif node.data == '*':
+                inner = fragments.pop()
+                add(start, inner[0])
+                add(inner[1], final)
+                add(inner[1], inner[0])
+                add(start, final)
+            else:
+                add(start, final, node.data)
+                lang.add(node.data)
+            fragments.append((start, final))
+
+        if alias:
+            for i in range(len(sources)):
+                sources[i] = alias.get(sources[i], sources[i])
+                targets[i] = alias.get(targets[i], targets[i])
+        q0, final = fragments.pop()
+        states = [state for state in range(last_q_num, count) if state not in alias]
+        nka = NKA.from_edges(states, lang, sources, targets, labels, q0, [final])
+        if stats is not None:
+            stats.update(nka_states=len(states), nka_transitions=len(labels))
+    return nka, count
+
+
+def nka_to_dka(nka: NKA, stats: BuildStats = None) -> DKA:
+    with build_phase(stats, 'closures'):
+        subsets = NKASubsets(nka)
+    with build_phase(stats, 'subsets'):
+        builder = SubsetBuilder(subsets.lang, subsets.step, subsets.is_final)
+        compiled, keys = builder.build(subsets.start, stats)
+    with build_phase(stats, 'views'):
+        return DKA.from_compiled(compiled, keys, set)
@@ -0,0 +1,186 @@
+import hashlib
+import importlib.util
+import os
+import py_compile
+import re
+import sys
+import types
+from lab1.cache import replace_file
+from lab1.classes import *
+
+# Part of the file names of cached modules: bump it whenever the generated
+# code changes, so that stale modules are never imported.
+GENERATOR_VERSION = '2'
+# Automata with more states than this are generated as per-state dicts
+# rather than per-state code blocks, which need a test per state and char.
+MAX_BLOCK_STATES = 16
+
+HEADER = '''\
+# Generated from a CompiledDKA by lab1.codegen, do not edit.
+import re
+from bisect import bisect_right
+
+RANGES = {ranges!r}
+STARTS = [lo for lo, hi, code in RANGES]
+DEAD_CODE = {dead_code!r}
+MEMO_SIZE = {memo_size!r}
+
+
+class Table(dict):
+    # Char code -> one char per alphabet class, DEAD_CODE outside of it;
+    # the input is translated with it in a single str.translate call.
+    # Like lab1's Alphabet, it memoizes at most MEMO_SIZE codes and never
+    # the ones outside of the alphabet.
+    def __missing__(self, code):
+        i = bisect_right(STARTS, code) - 1
+        if i < 0 or code > RANGES[i][1]:
+            return DEAD_CODE
+        value = RANGES[i][2]
+        if len(self) < MEMO_SIZE:
+            self[code] = value
+        return value
+
+
+TABLE = Table()
+'''
+
+
+def python_source(compiled: CompiledDKA) -> str:
+    # Source of a module with fullmatch(string) and match(string). Input is
+    # first translated to one char per alphabet class (DEAD_CODE for chars
+    # outside of it). Small automata with self-loops get a code block per
+    # state, see emit_blocks; all others step through a dict per state in
+    # a plain for loop, which is the cheapest loop CPython has.
+    width = compiled.width
+    dead = compiled.dead
+    codes = [chr(sym) for sym in range(width)] + [chr(width)]
+    ranges = [(lo, hi, codes[sym]) for lo, hi, sym in compiled.lookup.ranges]
+    accept = [state for state in range(dead) if compiled.accept[state]]
+    lines = [HEADER.format(ranges=ranges, dead_code=codes[width], memo_size=ALPHABET_MEMO_SIZE),
+             f'ACCEPT = frozenset({accept!r})']
+    loops = [state for state in range(dead)
+             if any(compiled.delta[state * width + sym] == state for sym in range(width))]
+    if loops and dead <= MAX_BLOCK_STATES:
+        # DEAD_CODE cannot occur when the classes cover every char.
+        total = sum(hi - lo + 1 for lo, hi, code in ranges) == sys.maxunicode + 1
+        emit_blocks(compiled, codes, loops, total, lines)
+    else:
+        emit_rows(compiled, codes, lines)
+    return '\n'.join(lines) + '\n'
+
+
+def emit_rows(compiled, codes, lines):
+    width = compiled.width
+    dead = compiled.dead
+    rows = []
+    for state in range(dead + 1):
+        row = {codes[sym]: compiled.delta[state * width + sym] for sym in range(width)}
+        row[codes[width]] = dead
+        rows.append(row)
+    lines += [f'ROWS = {tuple(rows)!r}', '', '',
+              'def fullmatch(string):',
+              f'    state = {compiled.start}',
+              '    for c in string.translate(TABLE):',
+              '        state = ROWS[state][c]',
+              f'        if state == {dead}:',
+              '            return False',
+              '    return state in ACCEPT', '', '',
+              'def match(string):',
+              f'    state = {compiled.start}',
+              '    if state in ACCEPT:',
+              '        return True',
+              '    for c in string.translate(TABLE):',
+              '        state = ROWS[state][c]',
+              '        if state in ACCEPT:',
+              '            return True',
+              f'        if state == {dead}:',
+              '            return False',
+              '    return False']
+
+
+def emit_blocks(compiled, codes, loops, total, lines):
+    # Every state is an if-block testing the next char against the classes
+    # of each target. A state with self-loops skips the rest of a run with
+    # str.find when a single code can leave it, and with a precompiled
+    # regexp match over the loop's classes otherwise.
+    width = compiled.width
+    dead = compiled.dead
+    exits = {}
+    for state in loops:
+        loop = ''.join(codes[sym] for sym in range(width) if compiled.delta[state * width + sym] == state)
+        exits[state] = [code for code in codes[:width] if code not in loop] + ([] if total else [codes[width]])
+        if len(exits[state]) > 1:
+            lines.append(f'LOOP_{state} = re.compile({"[" + re.escape(loop) + "]*"!r}).match')
+
+    def emit_state(state, prefix, indent):
+        pad = ' ' * indent
+        targets = {}
+        for sym in range(width):
+            targets.setdefault(compiled.delta[state * width + sym], []).append(codes[sym])
+        loop = targets.pop(state, None)
+        targets.pop(dead, None)
+        out = ['c = codes[i]', 'i += 1']
+        if loop:
+            if not exits[state]:
+                skip = ['i = n']
+            elif len(exits[state]) == 1:
+                skip = [f'i = codes.find({exits[state][0]!r}, i)', 'if i < 0:', '    i = n']
+            else:
+                skip = [f'i = LOOP_{state}(codes, i).end()']
+            out += [f'if c in {"".join(loop)!r}:'] + ['    ' + line for line in skip] + ['    continue']
+        branches = sorted(targets.items(), key=lambda item: -len(item[1]))
+        for target, group in branches:
+            test = f'c == {group[0]!r}' if len(group) == 1 else f'c in {"".join(group)!r}'
+            out.append(f'if {test}:')
+            if prefix and compiled.accept[target]:
+                out.append('    return True')
+            else:
+                out += [f'    state = {target}', '    continue']
+        out.append('return False')
+        lines.extend(pad + line for line in out)
+
+    for name, prefix in (('fullmatch', False), ('match', True)):
+        # match() returns as soon as an accepting state is entered, so only
+        # the other states need blocks there.
+        states = [state for state in range(dead) if not (prefix and compiled.accept[state])]
+        lines += ['', '', f'def {name}(string):']
+        if prefix and compiled.accept[compiled.start]:
+            lines.append('    return True')
+            continue
+        lines += ['    codes = string.translate(TABLE)', '    n = len(codes)', '    i = 0',
+                  f'    state = {compiled.start}', '    while i < n:']
+        for k, state in enumerate(states):
+            if len(states) == 1:
+                emit_state(state, prefix, 8)
+            else:
+                lines.append(f'        {"if" if k == 0 else "elif"} state == {state}:' if k < len(states) - 1
+                             else '        else:')
+                emit_state(state, prefix, 12)
+        if not states:
+            lines.append('        return False')
+        lines.append('    return False' if prefix else '    return state in ACCEPT')
+
+
+def load_matcher(compiled: CompiledDKA, directory=None) -> types.ModuleType:
+    # With directory, the source is kept there as dka_<hash>.py keyed by the
+    # binary form of compiled, with its .pyc in __pycache__, so later loads
+    # skip both generation and compilation.
+    if directory is None:
+        module = types.ModuleType('lab1_dka')
+        exec(compile(python_source(compiled), '<lab1 dka>', 'exec'), module.__dict__)
+        return module
+
+    digest = hashlib.sha256(GENERATOR_VERSION.encode() + b'\0' + compiled.to_bytes()).hexdigest()[:32]
+    name = f'dka_{digest}'
+    path = os.path.join(directory, f'{name}.py')
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        replace_file(path, python_source(compiled).encode('utf-8'))
+        py_compile.compile(path, doraise=True)
+    module = sys.modules.get(name)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[name] = module
+    return module
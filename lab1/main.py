@@ -1,10 +1,12 @@
 from lab1.classes import *
+from lab1.cache import DKACache
 
 
 # ex for ka: (xy*|ab|(x|a*))(x|y*), (a|b)*abb#
 def main():
+    cache = DKACache(minimize=False)
     regexp = input('Enter regular expression: ') + '#'
-    dka = get_dka(regexp)
+    dka = cache.get(regexp)
     choice = 1
     while choice:
         print('\nChoose action from menu below: ')
@@ -22,7 +24,7 @@ def main():
             dka.eval(string)
         if choice == 2:
             regexp = input('Enter regular expression: ') + '#'
-            dka = get_dka(regexp)
+            dka = cache.get(regexp)
         if choice == 3:
             dka.minimize()
         if choice == 4:
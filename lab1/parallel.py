@@ -0,0 +1,231 @@
+import argparse
+import os
+import time
+import zlib
+from array import array
+from multiprocessing import Pool, shared_memory
+from lab1.classes import *
+
+# Set in every worker by attach_table: the shared block and the CompiledDKA
+# read in place from it.
+worker_table = None
+worker_dka = None
+# Set in every worker by attach_subsets for parallel_nka_to_dka.
+worker_subsets = None
+
+
+class EvalReport(object):
+    def __init__(self, lines, matched, matches, seconds, processes):
+        self.lines = lines
+        self.matched = matched
+        self.matches = matches
+        self.seconds = seconds
+        self.processes = processes
+
+    @property
+    def lines_per_second(self):
+        return self.lines / self.seconds if self.seconds else 0.0
+
+    @property
+    def lines_per_second_per_core(self):
+        return self.lines_per_second / self.processes
+
+    def __str__(self):
+        return (f"{self.lines} lines, {self.matched} matched in {self.seconds:.3f} s on {self.processes} processes: "
+                f"{self.lines_per_second:.0f} lines/s, {self.lines_per_second_per_core:.0f} lines/s per core")
+
+
+def attach_table(name):
+    global worker_table, worker_dka
+    worker_table = shared_memory.SharedMemory(name=name)
+    worker_dka = CompiledDKA.from_buffer(worker_table.buf)
+
+
+def split_file(path, shards):
+    # Byte ranges [start, end); a range owns every line that starts in it.
+    size = os.path.getsize(path)
+    step = max(1, -(-size // shards))
+    return [(path, start, min(start + step, size)) for start in range(0, size, step)]
+
+
+def eval_shard(shard, collect_lines=False, dka=None):
+    path, start, end = shard
+    dka = dka or worker_dka
+    lines = matched = 0
+    matches = []
+    with open(path, 'rb') as f:
+        if start:
+            f.seek(start - 1)
+            f.readline()
+        offset = f.tell()
+        while offset < end:
+            line = f.readline()
+            if not line:
+                break
+            lines += 1
+            if dka.fullmatch(line.rstrip(b'\r\n').decode('latin-1')):
+                matched += 1
+                if collect_lines:
+                    matches.append((path, offset))
+            offset += len(line)
+    return lines, matched, matches
+
+
+def evaluate_files(dka, paths, processes=None, collect_lines=False, shards_per_process=4) -> EvalReport:
+    # Full-string evaluation of every line of paths. The compiled table is
+    # published once in shared memory, files are cut into line-aligned byte
+    # ranges and the per-range results are merged in file order.
+    compiled = dka.compile() if isinstance(dka, DKA) else dka
+    processes = processes or os.cpu_count()
+    shards = [shard for path in paths for shard in split_file(path, processes * shards_per_process)]
+    data = compiled.to_bytes()
+    table = shared_memory.SharedMemory(create=True, size=len(data))
+    started = time.perf_counter()
+    try:
+        table.buf[:len(data)] = data
+        with Pool(processes, initializer=attach_table, initargs=(table.name,)) as pool:
+            results = pool.starmap(eval_shard, [(shard, collect_lines) for shard in shards])
+    finally:
+        table.close()
+        table.unlink()
+    seconds = time.perf_counter() - started
+
+    matches = []
+    for _, _, shard_matches in results:
+        matches.extend(shard_matches)
+    return EvalReport(sum(x[0] for x in results), sum(x[1] for x in results), matches, seconds, processes)
+
+
+def attach_subsets(nka):
+    global worker_subsets
+    worker_subsets = NKASubsets(nka)
+
+
+def pack_subset(subset) -> bytes:
+    # Subsets travel between processes as sorted int arrays: cheaper to
+    # pickle, hash and compare than frozensets.
+    return array('i', sorted(subset)).tobytes()
+
+
+def unpack_subset(key) -> Set[int]:
+    states = array('i')
+    states.frombytes(key)
+    return set(states)
+
+
+def expand_subsets(keys, syms, nka_subsets=None):
+    # Successors of packed subsets along syms as (targets, finals, rows):
+    # every distinct non-empty successor is sent back once with finals[i]
+    # telling whether targets[i] accepts, and rows index into targets, -1
+    # for the dead sink.
+    nka_subsets = nka_subsets or worker_subsets
+    step = nka_subsets.step
+    targets = []
+    finals = bytearray()
+    index = {}
+    rows = []
+    for key in keys:
+        subset = frozenset(unpack_subset(key))
+        row = []
+        for sym in syms:
+            target = step(subset, sym)
+            if not target:
+                row.append(-1)
+                continue
+            idx = index.get(target)
+            if idx is None:
+                idx = index[target] = len(targets)
+                targets.append(pack_subset(target))
+                finals.append(nka_subsets.is_final(target))
+            row.append(idx)
+        rows.append(row)
+    return targets, bytes(finals), rows
+
+
+def parallel_nka_to_dka(nka: NKA, processes=None, stats: BuildStats = None, min_parallel=256,
+                        buckets_per_process=4) -> DKA:
+    # nka_to_dka with the subsets expanded on a process pool, one BFS level
+    # at a time. A level of at least min_parallel subsets is split into
+    # buckets by subset hash and workers step the buckets; the coordinator
+    # only dedupes the distinct successors of each bucket and translates
+    # its rows. New subsets get ids bucket by bucket, so the result is the
+    # serial DKA up to state numbering (exactly the serial one when no
+    # level is split). The pool is started by the first level big enough;
+    # with fewer than two processes this is plain nka_to_dka.
+    processes = processes or os.cpu_count()
+    if processes < 2:
+        return nka_to_dka(nka, stats)
+    with build_phase(stats, 'closures'):
+        subsets = NKASubsets(nka)
+    with build_phase(stats, 'subsets'):
+        start = pack_subset(subsets.start)
+        final_keys = {start} if subsets.is_final(subsets.start) else set()
+        builder = SubsetBuilder(subsets.lang, subsets.step, final_keys.__contains__)
+        syms = list(builder.symbols)
+        keys = [start]
+        index = {start: 0}
+        rows = []
+        frontier = range(0, 1)
+        pool = None
+        try:
+            while frontier:
+                if len(frontier) < min_parallel:
+                    parts = [(frontier, expand_subsets(keys[frontier.start:], syms, subsets))]
+                else:
+                    if pool is None:
+                        # A copy, so workers do not unpickle the closures
+                        # computed here so far.
+                        pool = Pool(processes, initializer=attach_subsets, initargs=(nka.copy(),))
+                    buckets = [[] for _ in range(processes * buckets_per_process)]
+                    for i in frontier:
+                        buckets[zlib.crc32(keys[i]) % len(buckets)].append(i)
+                    buckets = [bucket for bucket in buckets if bucket]
+                    results = pool.starmap(expand_subsets, [([keys[i] for i in bucket], syms) for bucket in buckets])
+                    parts = list(zip(buckets, results))
+
+                first = len(keys)
+                rows += [None] * len(frontier)
+                for ids, (targets, finals, part_rows) in parts:
+                    states = []
+                    for target, final in zip(targets, finals):
+                        state = index.get(target)
+                        if state is None:
+                            state = index[target] = len(keys)
+                            keys.append(target)
+                            if final:
+                                final_keys.add(target)
+                        states.append(state)
+                    # Row entries of -1 pick this last item: the dead sink.
+                    states.append(-1)
+                    for i, row in zip(ids, part_rows):
+                        rows[i] = [states[idx] for idx in row]
+                frontier = range(first, len(keys))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        compiled, keys = builder.table(keys, rows)
+        if stats is not None:
+            stats.update(**SubsetBuilder.describe([unpack_subset(key) for key in keys], rows))
+    with build_phase(stats, 'views'):
+        return DKA.from_compiled(compiled, keys, unpack_subset)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate every line of files with a DKA on a process pool')
+    parser.add_argument('regexp')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('-j', '--processes', type=int, default=None)
+    parser.add_argument('--lines', action='store_true', help='print offsets of matching lines')
+    args = parser.parse_args()
+
+    dka = get_dka(f'({args.regexp})#')
+    dka.minimize()
+    report = evaluate_files(dka, args.paths, args.processes, args.lines)
+    for path, offset in report.matches:
+        print(f'{path}:{offset}')
+    print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+import copy
+import json
+from lab1.bench import bench_regexp, compare, run_suite
+
+
+def test_bench_regexp_records_metrics():
+    res = bench_regexp('(a|b)*abb', 'ab', samples=50)
+
+    assert res['states'] == 4 and res['min_states'] == 4
+    assert res['transitions'] == 8
+    for phase in ['parse', 'get_dka', 'get_nka', 'nka_to_dka', 'minimize']:
+        assert res[phase]['seconds'] >= 0 and res[phase]['peak_kb'] > 0
+    assert res['match_per_s'] > 0 and res['re_per_s'] > 0
+
+
+def test_quick_suite_is_json(tmp_path):
+    results = run_suite(['blowup', 'alternation'], quick=True)
+    path = tmp_path / 'bench.json'
+    path.write_text(json.dumps(results))
+
+    assert set(json.loads(path.read_text())['results']) == {'blowup[4]', 'alternation[8]'}
+
+
+def test_compare_flags_regressions():
+    old = {'results': {'x': {'get_dka': {'seconds': 0.5, 'peak_kb': 100.0}, 'states': 10, 'match_per_s': 1000.0},
+                       'gone': {'states': 1}}}
+    new = copy.deepcopy(old)
+
+    assert compare(old, new) == []
+    new['results']['x']['get_dka']['seconds'] = 1.0
+    new['results']['x']['match_per_s'] = 500.0
+    new['results']['x']['states'] = 11
+    assert compare(old, new) == [('x', 'get_dka.seconds', 0.5, 1.0), ('x', 'match_per_s', 1000.0, 500.0)]
@@ -0,0 +1,95 @@
+import os
+import re
+import threading
+import pytest
+from lab1.cache import DKACache, load_compiled, save_compiled
+from lab1.classes import CompiledDKA
+
+
+@pytest.mark.parametrize("regexp", ['(a|b)*abb', '(xy*|ab|(x|a*))(x|y*)', 'ё(я|ж)*'])
+def test_serialization_roundtrip(regexp, build_dka, all_strings, tmp_path):
+    compiled = build_dka(regexp).compile()
+    path = tmp_path / 'dka.bin'
+    save_compiled(compiled, path)
+    loaded = load_compiled(path)
+
+    assert loaded.symbols == compiled.symbols
+    assert list(loaded.delta) == list(compiled.delta)
+    assert loaded.accept == compiled.accept
+    assert loaded.start == compiled.start
+    for string in all_strings('abxyёяж', 3):
+        assert loaded.fullmatch(string) == bool(re.fullmatch(regexp, string))
+
+
+def test_from_buffer_rejects_bad_data(build_dka):
+    data = build_dka('ab').compile().to_bytes()
+
+    for bad in [b'', data[:-1], b'XXXX' + data[4:], data[:4] + b'\x09' + data[5:]]:
+        with pytest.raises(ValueError):
+            CompiledDKA.from_buffer(bad)
+
+
+def test_cache_layers(tmp_path):
+    cache = DKACache(str(tmp_path), maxsize=2)
+    first = cache.get('((a|b)*abb)#')
+
+    assert cache.get('((a|b)*abb)#').compile() is first.compile()
+    assert cache.stats == {'memory': 1, 'disk': 0, 'compiled': 1}
+    assert len(first.states) == 4
+
+    cache.get('(ab)#')
+    cache.get('(ba)#')
+    again = DKACache(str(tmp_path)).get('((a|b)*abb)#')
+    assert cache.get('((a|b)*abb)#').compile() is not first.compile()
+    assert cache.stats['disk'] == 1
+    assert again.fullmatch('babb') and not again.fullmatch('bab')
+
+
+def test_cache_rebuilds_corrupt_file(tmp_path):
+    cache = DKACache(str(tmp_path))
+    with open(cache.path('(ab)#'), 'wb') as f:
+        f.write(b'garbage')
+
+    assert cache.get('(ab)#').fullmatch('ab')
+    assert cache.stats['compiled'] == 1
+    assert DKACache(str(tmp_path)).get('(ab)#').fullmatch('ab')
+
+
+def test_callers_get_copies(tmp_path):
+    cache = DKACache(str(tmp_path), minimize=False)
+    dka = cache.get('((a|b)*(ab|bb))#')
+    assert len(dka.states) == 4
+    dka.minimize()
+    assert len(dka.states) == 3
+    assert len(cache.get('((a|b)*(ab|bb))#').states) == 4
+
+
+@pytest.mark.parametrize("minimize", [False, True])
+def test_disk_hits_keep_state_labels(tmp_path, minimize):
+    cold = DKACache(str(tmp_path), minimize=minimize).get('((a|b)*(ab|bb))#')
+    warm = DKACache(str(tmp_path), minimize=minimize).get('((a|b)*(ab|bb))#')
+    assert warm.states == cold.states
+    assert warm.q0 == cold.q0 == {1, 2, 3, 5}
+    assert warm.finish_states == cold.finish_states
+
+
+def test_threads_saving_one_file(build_dka, tmp_path):
+    compiled = build_dka('(a|b)*abb').compile()
+    path = str(tmp_path / 'dka.bin')
+    errors = []
+
+    def save():
+        try:
+            for i in range(20):
+                save_compiled(compiled, path)
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert load_compiled(path).fullmatch('babb')
+    assert os.listdir(str(tmp_path)) == ['dka.bin']
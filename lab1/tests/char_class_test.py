@@ -0,0 +1,82 @@
+import re
+import pytest
+import lab1.classes
+from lab1.classes import (get_dka, get_glushkov_matcher, get_lazy_dka, get_moves, get_nka, get_syntax_tree,
+                          nka_to_dka, parse_char_class, split_alphabet, Alphabet, LazyDKA)
+
+REGEXPS = ['[a-c][a-c0-9]*', '(a|[^ab])*b', '[0-9]*(x|[w-z])', '([\\]\\-]|a)*', 'b*[abc]c', '[\\\\-a]*']
+ALPHABET = 'abcdwxz019]-_\\'
+
+
+@pytest.mark.parametrize("regexp", REGEXPS)
+def test_classes_agree_with_re(regexp, build_dka, all_strings):
+    dka = build_dka(regexp)
+    glushkov = get_glushkov_matcher(f'({regexp})#')
+    lazy = get_lazy_dka(f'({regexp})#')
+    nka, _ = get_nka(get_syntax_tree(f'({regexp})#'), 0)
+    from_nka = nka_to_dka(nka)
+    lazy_nka = LazyDKA.from_nka(nka)
+    strings = list(all_strings(ALPHABET, 3))
+    expected = [bool(re.fullmatch(regexp, string)) for string in strings]
+    for string, res in zip(strings, expected):
+        assert dka.fullmatch(string) == res, string
+        assert glushkov.fullmatch(string) == res, string
+        assert lazy.fullmatch(string) == res, string
+        assert from_nka.fullmatch(string) == res, string
+        assert lazy_nka.fullmatch(string) == res, string
+    assert [bool(x) for x in dka.eval_many(strings)] == expected
+
+
+def test_parse_char_class():
+    assert parse_char_class('[a-z0-9_]') == ((48, 57), (95, 95), (97, 122))
+    assert parse_char_class('[cba-b]') == ((97, 99),)
+    assert parse_char_class('[\\]\\-]') == ((45, 45), (93, 93))
+    assert parse_char_class('[\\\\-a]') == ((92, 97),)
+    assert parse_char_class('[a\\\\]') == ((92, 92), (97, 97))
+    assert parse_char_class('[^b-y]')[:2] == ((0, 97), (122, 1114111))
+    with pytest.raises(ValueError):
+        parse_char_class('[z-a]')
+
+
+@pytest.mark.parametrize("regexp", ['[]', 'a[b', '[^]', 'a]('])
+def test_bad_classes(regexp):
+    with pytest.raises(ValueError):
+        get_syntax_tree(regexp)
+
+
+def test_split_alphabet():
+    classes = split_alphabet(['a', '[a-z]', '[0-9a-c]'])
+    assert {label: ranges for label, (ranges, members) in classes.items()} == {
+        'a': ((97, 97),), '[b-c]': ((98, 99),), '[d-z]': ((100, 122),), '[0-9]': ((48, 57),)}
+    assert classes['[b-c]'][1] == ['[0-9a-c]', '[a-z]']
+    assert get_moves('(a|b|c)*d') == {'a', 'b', 'c', 'd'}
+    assert get_moves('[a-z]x|[a-c]') == {'[a-c]', '[d-wy-z]', 'x'}
+
+
+def test_alphabet_lookup():
+    alphabet = Alphabet.from_symbols({'a': 0, '[b-y]': 1, 'eps': 2})
+    assert [alphabet[char] for char in 'abmyz'] == [0, 1, 1, 1, None]
+    assert alphabet['ab'] is None
+
+
+def test_alphabet_memo_is_bounded(monkeypatch):
+    matcher = get_dka('(ab*)#').compile()
+    assert not any(matcher.fullmatch(chr(code)) for code in range(0x4e00, 0x4e00 + 50000))
+    assert len(matcher.lookup) == 2
+    monkeypatch.setattr(lab1.classes, 'ALPHABET_MEMO_SIZE', 100)
+    wide = get_dka('([^x]*)#').compile()
+    assert wide.fullmatch(''.join(chr(code) for code in range(0x4e00, 0x4e00 + 5000)))
+    assert len(wide.lookup) == 100
+
+
+def test_width_does_not_grow_tables():
+    narrow = get_dka('([a-b]*x[a-b])#')
+    wide = get_dka('([^x]*x[^x])#')
+    assert len(narrow.compile().symbols) == len(wide.compile().symbols) == 2
+    assert wide.fullmatch('中文x\U0001f600')
+    assert not wide.fullmatch('xx')
+    assert list(wide.compile().byte_table()[ord('w'):ord('z')]) == [0, 1, 0]
+
+    dka = get_dka('([\u0000-\U0010ffff]*[a-z])#')
+    assert len(dka.lang) == dka.compile().width == 2
+    assert len(dka.states) == 2 and dka.fullmatch('éq')
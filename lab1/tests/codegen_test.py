@@ -0,0 +1,60 @@
+import os
+import re
+import pytest
+import lab1.codegen
+from lab1.bench import bench_codegen
+from lab1.codegen import load_matcher, python_source
+
+REGEXPS = ['(a|b)*abb', '[^x]*x[a-c]|(ab)*', 'x[a-c]*y|z', '[^ ]* [0-9]*ms', 'a*', 'ab(c|x)', '(a|b|c|x|y|z| |m)*']
+
+
+@pytest.mark.parametrize("blocks", [16, 0], ids=['blocks', 'rows'])
+@pytest.mark.parametrize("regexp", REGEXPS)
+def test_generated_matcher_agrees(regexp, blocks, monkeypatch, build_dka, all_strings):
+    monkeypatch.setattr(lab1.codegen, 'MAX_BLOCK_STATES', blocks)
+    dka = build_dka(regexp)
+    matcher = dka.compile_to_python()
+    for string in all_strings('abcxy m0', 4):
+        assert matcher.fullmatch(string) == bool(re.fullmatch(regexp, string)), string
+        assert matcher.match(string) == dka.match(string), string
+    assert not matcher.fullmatch('\U0001f600')
+
+
+def test_table_memo_is_bounded(monkeypatch, build_dka):
+    matcher = build_dka('ab*').compile_to_python()
+    assert not matcher.fullmatch(''.join(chr(code) for code in range(0x4e00, 0x4e00 + 50000)))
+    assert len(matcher.TABLE) == 0
+    assert matcher.fullmatch('abb') and len(matcher.TABLE) == 2
+    monkeypatch.setattr(lab1.codegen, 'ALPHABET_MEMO_SIZE', 100)
+    wide = build_dka('[^x]*').compile_to_python()
+    assert wide.fullmatch(''.join(chr(code) for code in range(0x4e00, 0x4e00 + 5000)))
+    assert len(wide.TABLE) == 100
+
+
+def test_self_loops_are_skipped(build_dka):
+    source = python_source(build_dka('[^x]*x[a-c]*').compile())
+    assert 'codes.find(' in source
+    assert 'LOOP_' in source
+    matcher = build_dka('[^x]*x[a-c]*').compile_to_python()
+    assert matcher.fullmatch('q' * 10000 + 'x' + 'abc' * 1000)
+    assert not matcher.fullmatch('q' * 10000 + 'x' + 'abc' * 1000 + 'x')
+
+
+def test_disk_cache(tmp_path, build_dka):
+    compiled = build_dka('(a|b)*abb').compile()
+    matcher = load_matcher(compiled, str(tmp_path))
+    [source] = [name for name in os.listdir(tmp_path) if name.endswith('.py')]
+    assert os.listdir(tmp_path / '__pycache__')
+    assert matcher.fullmatch('aabb') and not matcher.fullmatch('abab')
+
+    mtime = os.path.getmtime(tmp_path / source)
+    assert load_matcher(compiled, str(tmp_path)) is matcher
+    assert os.path.getmtime(tmp_path / source) == mtime
+    other = load_matcher(build_dka('ab').compile(), str(tmp_path))
+    assert other is not matcher and other.fullmatch('ab')
+
+
+def test_bench_codegen():
+    [row] = bench_codegen({'identifier': ('[a-z_][a-z0-9_]*', 'abz_09', 16, '', '')}, samples=50)
+    assert row['states'] == 2
+    assert row['table_per_s'] > 0 and row['generated_per_s'] > 0
@@ -0,0 +1,73 @@
+import gc
+import pickle
+import tracemalloc
+from lab1.classes import get_dka, get_nka, get_syntax_tree, nka_to_dka, CompiledDKA, DKA, NKA, Tree
+
+
+def test_legacy_views(build_dka):
+    dka = build_dka('(a|b)*ab')
+    compiled = dka.compile()
+    assert dka.states == [{1, 2, 3}, {1, 2, 3, 4}, {1, 2, 3, 5}]
+    assert dka.q0 == {1, 2, 3}
+    assert dka.finish_states == [{1, 2, 3, 5}]
+    assert dka.lang == {'a', 'b'}
+    assert {'in': {1, 2, 3, 4}, 'out': {1, 2, 3, 5}, 'move': 'b'} in dka.moves
+    assert len(dka.moves) == 6
+    assert dka.moves_table[1][2] == ['b']
+    assert dka.compile() is compiled
+
+
+def test_views_survive_minimize():
+    nka, _ = get_nka(get_syntax_tree('((a|b)*abb)#'), 0)
+    dka = nka_to_dka(nka)
+    states = dka.states
+    dka.minimize()
+    assert len(dka.states) == 4
+    assert all(state in states for state in dka.states)
+    assert dka.q0 == states[0]
+    assert dka.fullmatch('babb') and not dka.fullmatch('bab')
+
+
+def test_slots():
+    for obj in [get_dka('(ab)#'), get_dka('(ab)#').compile(), get_nka(Tree('a'), 0)[0], Tree('a')]:
+        assert not hasattr(obj, '__dict__')
+    assert set(DKA.__slots__) >= {'_compiled', '_keys'}
+    assert isinstance(NKA.__slots__, tuple) and isinstance(CompiledDKA.__slots__, tuple)
+
+
+def test_pickle(build_dka):
+    dka = pickle.loads(pickle.dumps(build_dka('[a-z]x|y')))
+    assert dka.fullmatch('qx') and not dka.fullmatch('x')
+    assert dka.states == [{1, 3}, {2}, {2, 4}, {4}]
+
+
+def test_large_dka_is_compact():
+    regexp = '((a|b)*a' + '(a|b)' * 13 + ')#'
+    gc.collect()
+    tracemalloc.start()
+    try:
+        dka = get_dka(regexp)
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert len(dka.compile()) == 2 ** 14 + 1
+    assert retained < 4 * 10 ** 6
+
+
+def test_setters_drop_the_compiled_table(build_dka):
+    dka = build_dka('ab')
+    assert dka.fullmatch('ab')
+    dka.finish_states = []
+    assert not dka.fullmatch('ab')
+
+    dka = build_dka('ab')
+    dka.compile()
+    dka.moves = [move for move in dka.moves if move['move'] != 'b']
+    assert not dka.match('ab')
+    assert len(dka.states) == 3 and dka.moves_table[0][1] == ['a']
+
+    dka = build_dka('ab|b')
+    dka.q0 = dka.states[1]
+    assert dka.fullmatch('b') and not dka.fullmatch('ab')
+    assert not dka.prefilter
@@ -0,0 +1,50 @@
+import re
+import pytest
+
+REGEXPS = ['(a|b)*abb', 'xy*|ab', '(xy*|ab|(x|a*))(x|y*)', 'a(b|c)*d', '((ab)*|c)*']
+
+
+@pytest.mark.parametrize("regexp", REGEXPS)
+def test_fullmatch_agrees_with_re(regexp, build_dka, all_strings):
+    compiled = build_dka(regexp).compile()
+    for string in all_strings('abcdxy', 4):
+        assert compiled.fullmatch(string) == bool(re.fullmatch(regexp, string)), string
+
+
+@pytest.mark.parametrize("regexp", REGEXPS)
+def test_match_agrees_with_re(regexp, build_dka, all_strings):
+    dka = build_dka(regexp)
+    for string in all_strings('abxy', 4):
+        assert dka.match(string) == bool(re.match(regexp, string)), string
+
+
+def test_fullmatch_does_not_print(build_dka, capsys):
+    dka = build_dka('(a|b)*abb')
+
+    assert dka.fullmatch('babb') is True
+    assert dka.fullmatch('bab') is False
+    assert dka.fullmatch('abz') is False
+    assert capsys.readouterr().out == ''
+
+
+def test_eval_messages(build_dka, capsys):
+    dka = build_dka('ab')
+
+    assert dka.eval('ab') is True
+    assert dka.eval('z') is False
+    assert dka.eval('b') is False
+    assert dka.eval('a') is False
+    assert capsys.readouterr().out.splitlines() == ['String evaluated successfully', 'Wrong symbol detected',
+                                                     'String can not be evaluated',
+                                                     'String finish in non-finish state']
+
+
+def test_compile_invalidated_by_minimize(build_dka):
+    dka = build_dka('(a|b)*abb')
+    before = dka.compile()
+    dka.minimize()
+    after = dka.compile()
+
+    assert after is not before
+    assert len(after) == len(dka.states) + 1
+    assert after.fullmatch('aabb') and not after.fullmatch('abab')
@@ -0,0 +1,21 @@
+import itertools
+import pytest
+from lab1.classes import get_dka
+
+
+@pytest.fixture
+def build_dka():
+    def _build_dka(regexp):
+        return get_dka(f'({regexp})#')
+
+    return _build_dka
+
+
+@pytest.fixture
+def all_strings():
+    def _all_strings(alphabet, max_len):
+        for n in range(max_len + 1):
+            for chars in itertools.product(alphabet, repeat=n):
+                yield ''.join(chars)
+
+    return _all_strings
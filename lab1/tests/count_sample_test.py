@@ -0,0 +1,72 @@
+import re
+from collections import Counter
+import pytest
+import lab1.classes
+
+REGEXPS = ['(a|b)*abb', '[^x]*x[a-c]|(ab)*', 'x[a-c]*y|z', 'a*', 'ab(c|x)', '(a|b)*a(a|b)']
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(lab1.classes, 'np', None)
+    elif lab1.classes.np is None:
+        pytest.skip('numpy is not installed')
+    return request.param
+
+
+@pytest.mark.parametrize("regexp", [regexp for regexp in REGEXPS if '[' not in regexp])
+def test_count_matches_enumeration(regexp, backend, build_dka, all_strings):
+    dka = build_dka(regexp)
+    lengths = Counter(len(string) for string in all_strings('abcxyz', 4) if dka.fullmatch(string))
+    for n in range(5):
+        assert dka.count(n) == lengths[n], n
+
+
+def test_count_char_classes(backend, build_dka):
+    assert build_dka('[a-z]x').count(2) == 26
+    assert build_dka('[^x]').count(1) == 0x110000 - 1
+    assert build_dka('[a-c]*').count(3) == 27
+    assert build_dka('ab').count(3) == 0
+
+
+def test_count_large(backend, build_dka):
+    dka = build_dka('(a|b)*')
+    assert dka.count(1000) == 2 ** 1000
+    assert dka.count(1000, mod=10 ** 9 + 7) == pow(2, 1000, 10 ** 9 + 7)
+    assert build_dka('[a-z]*').count(50, mod=2 ** 61 - 1) == pow(26, 50, 2 ** 61 - 1)
+
+
+@pytest.mark.parametrize("regexp", REGEXPS)
+def test_samples_are_accepted(regexp, backend, build_dka):
+    dka = build_dka(regexp)
+    for n in [3, 4, 6]:
+        if not dka.count(n):
+            with pytest.raises(ValueError):
+                dka.sample(n, 5)
+            continue
+        samples = dka.sample(n, 50, seed=1)
+        assert len(samples) == 50
+        for string in samples:
+            assert len(string) == n and dka.fullmatch(string) and re.fullmatch(regexp, string), string
+
+
+def test_sample_is_uniform_and_seeded(backend, build_dka):
+    dka = build_dka('(a|b)*a(a|b)')
+    samples = dka.sample(3, 4000, seed=7)
+    assert samples == dka.sample(3, 4000, seed=7)
+    counts = Counter(samples)
+    assert set(counts) == {'aaa', 'aab', 'baa', 'bab'}
+    assert all(800 < c < 1200 for c in counts.values())
+    big = build_dka('[a-z]*').sample(40, 20, seed=0)
+    assert all(len(string) == 40 and string.isalpha() for string in big)
+    assert len(set(big)) == 20
+
+
+def test_samples_agree_across_backends(monkeypatch, build_dka):
+    if lab1.classes.np is None:
+        pytest.skip('numpy is not installed')
+    dka = build_dka('[^x]*x[a-c]|(ab)*')
+    samples = dka.sample(4, 30, seed=3)
+    monkeypatch.setattr(lab1.classes, 'np', None)
+    assert dka.sample(4, 30, seed=3) == samples
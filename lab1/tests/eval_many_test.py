@@ -0,0 +1,30 @@
+import re
+import pytest
+import lab1.classes
+
+REGEXPS = ['(a|b)*abb', '(xy*|ab|(x|a*))(x|y*)', '((ab)*|c)*']
+
+
+@pytest.mark.parametrize("regexp", REGEXPS)
+def test_eval_many_agrees_with_re(regexp, build_dka, all_strings):
+    strings = list(all_strings('abcxz', 4))
+    res = build_dka(regexp).eval_many(iter(strings), batch_size=100)
+
+    assert len(res) == len(strings)
+    assert [bool(x) for x in res] == [bool(re.fullmatch(regexp, s)) for s in strings]
+
+
+@pytest.mark.parametrize("regexp", REGEXPS)
+def test_eval_many_without_numpy(regexp, build_dka, all_strings, monkeypatch):
+    monkeypatch.setattr(lab1.classes, 'np', None)
+    strings = list(all_strings('abcxz', 3))
+    res = build_dka(regexp).eval_many(strings)
+
+    assert [bool(x) for x in res] == [bool(re.fullmatch(regexp, s)) for s in strings]
+
+
+def test_eval_many_empty_and_unicode(build_dka):
+    dka = build_dka('(a|b)*abb')
+
+    assert len(dka.eval_many([])) == 0
+    assert [bool(x) for x in dka.eval_many(['', 'abb', 'ёabb', 'abb\U0001f600'])] == [False, True, False, False]
@@ -0,0 +1,78 @@
+import io
+import json
+from lab1.bench import random_dka
+from lab1.classes import get_nka, get_syntax_tree, merge_labels, parse_char_class, DKA
+
+
+def test_merge_labels():
+    assert merge_labels(['b', 'a', '[c-z]', '0']) == '[0a-z]'
+    assert merge_labels(['#', 'a', 'eps']) == '[#a],eps'
+    assert merge_labels(['a', 'eps']) == 'a,eps'
+    assert merge_labels(['\x00', '[^\x00]']) == '[\\x00-\\U0010ffff]'
+    assert merge_labels(['+', '-', '.']) == '[+\\--.]'
+    assert merge_labels([',', 'a']) == '[\\,a]'
+    assert merge_labels([',', 'eps']) == '\\,,eps'
+    assert merge_labels(['[\\]\\-]', '\\']) == '[\\-\\\\-\\]]'
+    assert parse_char_class(merge_labels(['+', '-', '.', ']', ','])) == ((43, 46), (93, 93))
+
+
+def test_dot_merges_parallel_edges(build_dka):
+    dka = build_dka('[a-m]x|[n-z]x|0')
+    dka.minimize()
+    out = io.StringIO()
+    dka.export(out)
+    dot = out.getvalue()
+    assert dot.startswith('digraph finite_state_machine {')
+    assert '\tq0 -> q2 [label="[a-z]"]' in dot
+    assert '\tq0 -> q1 [label="0"]' in dot
+    assert dot.count(' -> ') == 4
+    assert dot.count('doublecircle') == 1
+
+
+def test_json_round_trip(build_dka):
+    dka = build_dka('([a-f]|[d-k]y)*z')
+    out = io.StringIO()
+    dka.export(out, format='json')
+    data = json.loads(out.getvalue())
+    moves = [{'in': state, 'out': target, 'move': label} for state, target, label in data['edges']]
+    copy = DKA(data['states'], set(move['move'] for move in moves), moves, data['start'], data['accept'])
+    assert copy.is_equivalent(dka)
+
+
+def test_nka_export():
+    nka, _ = get_nka(get_syntax_tree('(a|b)*#'), 0)
+    out = io.StringIO()
+    nka.export(out, format='json')
+    data = json.loads(out.getvalue())
+    assert len(data['states']) == len(nka.states)
+    eps = sum(move['move'] == 'eps' for move in nka.moves)
+    assert sorted(label for _, _, label in data['edges']) == ['#', 'a', 'b'] + ['eps'] * eps
+
+
+def test_neighbourhood(build_dka):
+    dka = build_dka('abcdef')
+    out = io.StringIO()
+    dka.export(out, format='json', around=[3], radius=1)
+    data = json.loads(out.getvalue())
+    assert data['states'] == [2, 3, 4]
+    assert [edge[:2] for edge in data['edges']] == [[2, 3], [3, 4]]
+    out = io.StringIO()
+    dka.export(out, around=[3], radius=1)
+    assert 'start' not in out.getvalue()
+
+
+def test_draw_fsm_without_viewer(tmp_path, build_dka):
+    path = tmp_path / 'fsm.gv'
+    build_dka('a*b').draw_fsm(str(path), view=False)
+    assert path.read_text().count(' -> ') == 3
+
+
+def test_large_export_merges_edges(tmp_path):
+    dka = random_dka(50000, lang='abcd')
+    path = tmp_path / 'fsm.gv'
+    dka.export(str(path))
+    lines = path.read_text(encoding='utf-8').splitlines()
+    edges = [line for line in lines if ' -> q' in line and not line.startswith('\tstart')]
+    assert len(edges) == len({(move['in'], move['out']) for move in dka.moves})
+    assert len({line.split('[label=')[1] for line in edges}) <= 2 ** 4 - 1
+    assert sum(line.startswith('\tq') and ' -> ' not in line for line in lines) == 50000
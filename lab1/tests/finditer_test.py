@@ -0,0 +1,47 @@
+import io
+import mmap
+import random
+import pytest
+
+
+def leftmost_longest(dka, text):
+    res = []
+    i = 0
+    while i < len(text):
+        ends = [j for j in range(i + 1, len(text) + 1) if dka.fullmatch(text[i:j])]
+        if ends:
+            res.append((i, ends[-1]))
+            i = ends[-1]
+        else:
+            i += 1
+    return res
+
+
+@pytest.mark.parametrize("regexp", ['ab*', '(a|b)*abb', 'x(ab|a)*y', 'aa|aaa'])
+@pytest.mark.parametrize("chunk_size", [1, 3, 64])
+def test_finditer_leftmost_longest(regexp, chunk_size, build_dka):
+    dka = build_dka(regexp)
+    rnd = random.Random(chunk_size)
+    for i in range(30):
+        text = ''.join(rnd.choice('abxy-') for _ in range(rnd.randint(0, 40)))
+        expected = leftmost_longest(dka, text)
+
+        assert list(dka.finditer(text.encode(), chunk_size)) == expected, text
+        assert list(dka.finditer(io.BytesIO(text.encode()), chunk_size)) == expected, text
+
+
+def test_finditer_mmap(build_dka, tmp_path):
+    dka = build_dka('err(o|r)*')
+    path = tmp_path / 'log.txt'
+    path.write_bytes(b'ok\nerror here\nerrr\n' * 1000)
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        matches = list(dka.finditer(m, chunk_size=1000))
+
+    assert len(matches) == 2000
+    assert matches[:2] == [(3, 8), (14, 18)]
+    assert matches[-1] == (19 * 999 + 14, 19 * 999 + 18)
+
+
+def test_finditer_ignores_empty_matches(build_dka):
+    assert list(build_dka('a*').finditer(b'baab')) == [(1, 3)]
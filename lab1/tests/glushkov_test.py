@@ -0,0 +1,45 @@
+import random
+import re
+import pytest
+from lab1.classes import get_dka, get_glushkov_matcher
+
+REGEXPS = ['(a|b)*abb', '(xy*|ab|(x|a*))(x|y*)', '((ab)*|c)*', 'a(b|c)*d']
+
+
+@pytest.mark.parametrize("regexp", REGEXPS)
+def test_glushkov_agrees_with_re(regexp, all_strings):
+    matcher = get_glushkov_matcher(f'({regexp})#')
+    for string in all_strings('abcdxy', 4):
+        assert matcher.fullmatch(string) == bool(re.fullmatch(regexp, string)), string
+        assert matcher.match(string) == bool(re.match(regexp, string)), string
+
+
+def test_glushkov_step_matches_subset_construction():
+    regexp = '((a|b)*a(a|b)(a|b)|b(ab)*)#'
+    matcher = get_glushkov_matcher(regexp)
+    dka = get_dka(regexp)
+    index = {frozenset(state): i for i, state in enumerate(dka.states)}
+    compiled = dka.compile()
+    rnd = random.Random(0)
+    for i in range(50):
+        active, state = matcher.start, compiled.start
+        for char in rnd.choices('ab', k=12):
+            active = matcher.step(active, char)
+            state = compiled.step(state, char)
+            if not active:
+                assert state == compiled.dead
+                break
+            positions = frozenset(pos for pos in range(active.bit_length()) if active >> pos & 1)
+            assert index[positions] == state
+
+
+def test_glushkov_wide_pattern():
+    n = 40
+    regexp = '((a|b)*a' + '(a|b)' * n + ')#'
+    matcher = get_glushkov_matcher(regexp)
+    rnd = random.Random(1)
+
+    for i in range(100):
+        string = ''.join(rnd.choice('ab') for _ in range(rnd.randint(n, 3 * n)))
+        assert matcher.fullmatch(string) == (string[-n - 1] == 'a')
+    assert list(matcher.eval_many(['a' + 'b' * n, 'b' * n, 'c'])) == [1, 0, 0]
@@ -0,0 +1,63 @@
+import random
+import re
+import pytest
+from lab1.classes import LazyDKA, get_lazy_dka, get_nka, get_syntax_tree
+
+REGEXPS = ['(a|b)*abb', '(xy*|ab|(x|a*))(x|y*)', '((ab)*|c)*']
+
+
+@pytest.mark.parametrize("regexp", REGEXPS)
+def test_lazy_dka_agrees_with_re(regexp, all_strings):
+    lazy = get_lazy_dka(f'({regexp})#')
+    for string in all_strings('abcxy', 4):
+        assert lazy.fullmatch(string) == bool(re.fullmatch(regexp, string)), string
+        assert lazy.match(string) == bool(re.match(regexp, string)), string
+
+
+def test_lazy_dka_from_nka(all_strings):
+    nka, _ = get_nka(get_syntax_tree('((a|b)*a(a|b))#'), 0)
+    lazy = LazyDKA.from_nka(nka)
+
+    for string in all_strings('abc', 5):
+        assert lazy.fullmatch(string) == bool(re.fullmatch('(a|b)*a(a|b)', string)), string
+
+
+@pytest.mark.parametrize("source", ['positions', 'nka'])
+def test_lazy_dka_cache_is_bounded(source):
+    n = 12
+    regexp = '((a|b)*a' + '(a|b)' * n + ')#'
+    nka, _ = get_nka(get_syntax_tree(regexp), 0)
+    lazy = get_lazy_dka(regexp, cache_size=64) if source == 'positions' else LazyDKA.from_nka(nka, cache_size=64)
+    rnd = random.Random(1)
+    for i in range(20):
+        string = ''.join(rnd.choice('ab') for _ in range(300))
+        assert lazy.fullmatch(string) == (string[-n - 1] == 'a')
+        assert len(lazy.cache) <= 64
+        assert len(nka._closure_cache) == 0
+
+    assert lazy.stats['evictions'] > 0
+
+
+@pytest.mark.parametrize("source", ['positions', 'nka'])
+def test_lazy_dka_falls_back_when_thrashing(source):
+    n = 12
+    regexp = '((a|b)*a' + '(a|b)' * n + ')#'
+    nka, _ = get_nka(get_syntax_tree(regexp), 0)
+    lazy = get_lazy_dka(regexp, cache_size=16) if source == 'positions' else LazyDKA.from_nka(nka, cache_size=16)
+    rnd = random.Random(2)
+    string = ''.join(rnd.choice('ab') for _ in range(5000))
+
+    assert lazy.fullmatch(string) == (string[-n - 1] == 'a')
+    assert lazy.stats['fallbacks'] == 1
+    assert lazy.stats['misses'] < 5000
+    assert len(nka._closure_cache) == 0
+
+
+def test_lazy_dka_eval(capsys):
+    lazy = get_lazy_dka('(ab)#')
+
+    assert lazy.eval('ab') and not lazy.eval('az') and not lazy.eval('b') and not lazy.eval('a')
+    assert list(lazy.eval_many(['ab', 'a', ''])) == [1, 0, 0]
+    assert capsys.readouterr().out.splitlines() == ['String evaluated successfully', 'Wrong symbol detected',
+                                                     'String can not be evaluated',
+                                                     'String finish in non-finish state']
@@ -0,0 +1,51 @@
+import re
+import pytest
+from lab1.bench import random_dka
+
+REGEXPS = [('(a|b)*abb', 4), ('ab|cd', 4), ('a(b|c)*d', 3), ('(xy*|ab|(x|a*))(x|y*)', 7), ('(ab|ab)*', 2)]
+
+
+@pytest.mark.parametrize("regexp, count", REGEXPS)
+def test_minimize_keeps_language(regexp, count, build_dka, all_strings):
+    dka = build_dka(regexp)
+    dka.minimize()
+
+    assert len(dka.states) == count
+    for string in all_strings('abcdxy', 4):
+        assert dka.fullmatch(string) == bool(re.fullmatch(regexp, string)), string
+
+
+def test_minimize_mapping():
+    dka = random_dka(40, seed=3)
+    old_states = list(dka.states)
+    live = dka.compile().live_states()
+    mapping = dka.minimize()
+
+    assert len(mapping) == len(old_states)
+    assert [new is None for new in mapping] == [not live[i] for i in range(len(old_states))]
+    for old, new in zip(old_states, mapping):
+        if new is not None:
+            assert (old in dka.finish_states) == (dka.states[new] in dka.finish_states)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_minimize_random_dka(seed, all_strings):
+    dka = random_dka(60, seed=seed)
+    strings = list(all_strings('ab', 8))
+    expected = [dka.fullmatch(s) for s in strings]
+    dka.minimize()
+    count = len(dka.states)
+
+    assert [dka.fullmatch(s) for s in strings] == expected
+    dka.minimize()
+    assert len(dka.states) == count
+
+
+def test_minimize_empty_language():
+    dka = random_dka(10)
+    dka.finish_states = []
+    dka.minimize()
+
+    assert len(dka.states) == 1
+    assert not dka.moves
+    assert not dka.fullmatch('')
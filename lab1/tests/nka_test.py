@@ -0,0 +1,91 @@
+import pytest
+from lab1.classes import NKA, get_nka, get_syntax_tree, nka_to_dka
+
+
+def bfs_closure(nka, state):
+    closure = {state}
+    queue = [state]
+    while queue:
+        s = queue.pop()
+        for move in nka.moves:
+            if move['in'] == s and move['move'] == 'eps' and move['out'] not in closure:
+                closure.add(move['out'])
+                queue.append(move['out'])
+    return closure
+
+
+@pytest.mark.parametrize("regexp", ['((a|b)*abb)#', '((a*|b*)*c)#', '(((ab)*)*|c*)#'])
+def test_eps_closures_match_bfs(regexp):
+    nka, _ = get_nka(get_syntax_tree(regexp), 0)
+
+    for state in nka.states:
+        assert set(nka.eps_closure(state)) == bfs_closure(nka, state)
+
+
+def test_eps_cycle_shares_closure():
+    moves = [{'in': 0, 'out': 1, 'move': 'eps'}, {'in': 1, 'out': 2, 'move': 'eps'},
+             {'in': 2, 'out': 0, 'move': 'eps'}, {'in': 2, 'out': 3, 'move': 'a'},
+             {'in': 1, 'out': 4, 'move': 'eps'}]
+    nka = NKA([0, 1, 2, 3, 4], ['a'], moves, 0, [3])
+
+    assert nka.eps_closures[0] is nka.eps_closures[2]
+    assert nka.eps_closures[0] == {0, 1, 2, 4}
+    assert nka.eps_closures[4] == {4}
+    assert nka.move({0, 1}, 'a') == set()
+    assert nka.move(nka.closure([0]), 'a') == {3}
+    assert nka.reachable(2, 'a') == [3]
+
+
+def test_closure_is_memoized():
+    nka, _ = get_nka(get_syntax_tree('((a|b)*abb)#'), 0)
+
+    assert nka.closure([nka.q0]) is nka.closure({nka.q0})
+
+
+def test_large_thompson_nka():
+    regexp = '(' + '|'.join(f'(a|b)*a{"(a|b)" * 8}' for _ in range(4)) + ')#'
+    nka, _ = get_nka(get_syntax_tree(regexp), 0)
+    dka = nka_to_dka(nka)
+
+    assert len(nka.states) > 200
+    dka.minimize()
+    assert len(dka.states) == 2 ** 9
+    assert dka.fullmatch('b' * 20 + 'a' + 'b' * 8)
+    assert not dka.fullmatch('b' * 20 + 'a' + 'b' * 9)
+
+
+def test_thompson_moves_view():
+    nka, last = get_nka(get_syntax_tree('(a|b)c'), 10)
+
+    assert last == 18
+    assert nka.states == [10, 11, 12, 13, 14, 15, 17]
+    assert nka.q0 == 14 and nka.finish_states == [17]
+    assert nka.lang == {'a', 'b', 'c'}
+    assert {'in': 15, 'out': 17, 'move': 'c'} in nka.moves
+    assert sorted(move['move'] for move in nka.moves) == ['a', 'b', 'c'] + ['eps'] * 4
+
+
+
+def test_moves_setter_drops_caches():
+    nka, _ = get_nka(get_syntax_tree('(ab)#'), 0)
+    assert nka_to_dka(nka).fullmatch('ab')
+    assert nka.closure([nka.q0])
+    nka.moves = [dict(move, move='c') if move['move'] == 'b' else move for move in nka.moves]
+    nka.lang = {'a', 'c', '#'}
+    dka = nka_to_dka(nka)
+    assert dka.fullmatch('ac') and not dka.fullmatch('ab')
+    assert 'c' in [sym for row in nka.moves_table for cell in row for sym in cell]
+
+
+@pytest.mark.parametrize("build", [lambda n: 'a' * n, lambda n: '|'.join('ab' * (n // 4)),
+                                   lambda n: '(' * (n // 4) + 'a' + '|b)*' * (n // 4)],
+                         ids=['concatenation', 'alternation', 'nesting'])
+def test_thompson_is_linear(build):
+    sizes = []
+    for n in (25000, 100000):
+        nka, _ = get_nka(get_syntax_tree(build(n) + '#'), 0)
+        assert n <= len(nka.states) <= 3 * n
+        assert len(nka.moves) <= 3 * n
+        sizes.append((len(nka.states), len(nka.moves)))
+    (states, moves), (more_states, more_moves) = sizes
+    assert more_states <= 4 * (states + 4) and more_moves <= 4 * (moves + 4)
@@ -0,0 +1,100 @@
+import pickle
+import random
+import pytest
+from lab1.bench import bench_parallel
+from lab1.classes import get_nka, get_syntax_tree, nka_to_dka, BuildStats
+from lab1.parallel import (eval_shard, evaluate_files, pack_subset, parallel_nka_to_dka, split_file,
+                           unpack_subset)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    rnd = random.Random(0)
+    paths = []
+    for i in range(2):
+        path = tmp_path / f'corpus{i}.txt'
+        lines = [''.join(rnd.choice('ab') for _ in range(rnd.randint(0, 12))) for _ in range(500)]
+        path.write_bytes(('\n'.join(lines) + '\n').encode())
+        paths.append(str(path))
+    return paths
+
+
+def test_split_file_keeps_every_line_once(corpus, build_dka):
+    dka = build_dka('(a|b)*abb').compile()
+    whole = eval_shard((corpus[0], 0, 10 ** 9), True, dka)
+    parts = [eval_shard(shard, True, dka) for shard in split_file(corpus[0], 7)]
+
+    assert sum(x[0] for x in parts) == whole[0] == 500
+    assert [m for x in parts for m in x[2]] == whole[2]
+
+
+def test_evaluate_files(corpus, build_dka):
+    dka = build_dka('(a|b)*abb')
+    report = evaluate_files(dka, corpus, processes=2, collect_lines=True)
+
+    expected = []
+    for path in corpus:
+        offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                if line.rstrip(b'\n').endswith(b'abb'):
+                    expected.append((path, offset))
+                offset += len(line)
+    assert report.lines == 1000
+    assert report.matched == len(expected)
+    assert report.matches == expected
+    assert report.lines_per_second_per_core > 0
+
+
+def blowup_nka(n):
+    return get_nka(get_syntax_tree(f'((a|b)*a{"(a|b)" * n})#'), 0)[0]
+
+
+def same_subsets(serial, parallel):
+    # Both DKAs have one state per subset: compare them through the subsets.
+    a, b = serial.compile(), parallel.compile()
+    index = {frozenset(parallel.state(i)): i for i in range(len(b) - 1)}
+    mapping = [index[frozenset(serial.state(i))] for i in range(len(a) - 1)] + [b.dead]
+    assert len(a) == len(b) and a.symbols == b.symbols
+    assert mapping[a.start] == b.start
+    for i in range(len(a)):
+        assert a.accept[i] == b.accept[mapping[i]]
+        for sym in range(a.width):
+            assert mapping[a.delta[i * a.width + sym]] == b.delta[mapping[i] * b.width + sym]
+
+
+def test_parallel_nka_to_dka_matches_serial():
+    serial = nka_to_dka(blowup_nka(7))
+    parallel = parallel_nka_to_dka(blowup_nka(7), processes=2, min_parallel=16)
+    same_subsets(serial, parallel)
+    assert parallel.fullmatch('ba' + 'b' * 7) and not parallel.fullmatch('b' * 9)
+
+
+def test_small_levels_stay_serial():
+    stats = BuildStats()
+    serial = nka_to_dka(blowup_nka(4))
+    parallel = parallel_nka_to_dka(blowup_nka(4), processes=2, stats=stats)
+    assert list(parallel.compile().delta) == list(serial.compile().delta)
+    assert parallel.states == serial.states
+    assert list(stats.phases) == ['closures', 'subsets', 'views']
+    assert stats.counters['states'] == len(serial.states)
+    assert nka_to_dka(blowup_nka(2)).states == parallel_nka_to_dka(blowup_nka(2), processes=1).states
+
+
+def test_workers_get_the_nka_without_caches():
+    nka = blowup_nka(6)
+    serial = nka_to_dka(nka)
+    copy = nka.copy()
+    assert nka._closure_cache and not copy._closure_cache and copy._adjacency is None
+    assert len(pickle.dumps(copy)) < len(pickle.dumps(nka))
+    assert nka_to_dka(copy).states == serial.states
+
+
+def test_pack_subset():
+    assert unpack_subset(pack_subset(frozenset([5, 1, 3]))) == {1, 3, 5}
+    assert pack_subset({3, 1}) == pack_subset(frozenset([1, 3]))
+
+
+def test_bench_parallel():
+    [row] = bench_parallel(sizes=(4,), processes=[2])
+    assert row['states'] == 33 and row['parallel'] > 0
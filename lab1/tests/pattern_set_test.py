@@ -0,0 +1,40 @@
+import re
+import pytest
+from lab1.classes import compile_set
+
+PATTERNS = ['(a|b)*abb', 'ab*', 'a(b|c)*', 'c*', 'abb']
+
+
+@pytest.mark.parametrize("minimize", [True, False])
+def test_fullmatch_all_agrees_with_re(minimize, all_strings):
+    patterns = compile_set(PATTERNS, minimize)
+
+    for string in all_strings('abc', 5):
+        expected = [i for i, p in enumerate(PATTERNS) if re.fullmatch(p, string)]
+        assert patterns.fullmatch_all(string) == expected, string
+        assert patterns.fullmatch(string) == (expected[0] if expected else None), string
+
+
+def test_minimize_keeps_tags():
+    full = compile_set(['(ab|cb)d', 'x', 'xd*'], minimize=False)
+    small = compile_set(['(ab|cb)d', 'x', 'xd*'])
+
+    assert len(small.compiled) < len(full.compiled)
+    assert small.fullmatch_all('x') == [1, 2]
+    assert small.fullmatch_all('cbd') == [0]
+    assert small.fullmatch_all('xdd') == [2]
+
+
+def test_match_prefers_longest_then_order():
+    patterns = compile_set(['if', '(i|f|x)(i|f|x)*', '=', '=='])
+
+    assert patterns.match('if x') == (0, 2)
+    assert patterns.match('iff=') == (1, 3)
+    assert patterns.match('==x') == (3, 2)
+    assert patterns.match('+') is None
+
+
+@pytest.mark.parametrize("regexps", [[], ['a#b']])
+def test_compile_set_errors(regexps):
+    with pytest.raises(ValueError):
+        compile_set(regexps)
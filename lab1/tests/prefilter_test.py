@@ -0,0 +1,96 @@
+import pickle
+import pytest
+import lab1.cache
+from lab1.bench import bench_prefilter
+from lab1.cache import DKACache
+from lab1.classes import get_dka, get_syntax_tree, required_literals, Prefilter, MAX_LITERAL_LENGTH
+
+REGEXPS = ['(a|b)*abb', 'x[a-c]*y|z', '(xy*|ab|(x|a*))(x|y*)', 'a(b|c)*d', '[ab]x[ab]', 'ab*c|b*', '(ab|ba)(ab|ba)']
+
+
+@pytest.mark.parametrize("regexp, literals", [
+    ('abc', ['abc']),
+    ('(a|b)*abb', ['abb']),
+    ('x[a-c]*y|z', ['x', 'z']),
+    ('(error|warn)ing: [a-z]*', ['erroring: ', 'warning: ']),
+    ('[Ee]rror', ['Error', 'error']),
+    ('foo[0-9]*bar', ['foo']),
+    ('a*', []),
+    ('(ab)*', []),
+    ('[a-z]x', ['x']),
+])
+def test_required_literals(regexp, literals):
+    assert required_literals(get_syntax_tree(regexp)) == literals
+
+
+def test_long_runs_are_clipped():
+    assert required_literals(get_syntax_tree('ab' * 50000)) == ['ab' * (MAX_LITERAL_LENGTH // 2)]
+    assert required_literals(get_syntax_tree('x' * 100 + '(c|d)' + 'y' * 100)) == ['x' * MAX_LITERAL_LENGTH]
+    assert required_literals(get_syntax_tree('(a|b)*' + 'x' * 100)) == ['x' * MAX_LITERAL_LENGTH]
+    assert required_literals(get_syntax_tree('(' + 'a' * 100 + '|b)')) == ['a' * MAX_LITERAL_LENGTH, 'b']
+
+
+@pytest.mark.parametrize("regexp", REGEXPS)
+def test_literals_are_required(regexp, build_dka, all_strings):
+    dka = build_dka(regexp)
+    literals = required_literals(get_syntax_tree(regexp))
+    assert dka.prefilter.literals == tuple(literals)
+    for string in all_strings('abcdxyz', 4):
+        if dka.compile().fullmatch(string):
+            assert any(literal in string for literal in literals) or not literals, string
+        assert dka.fullmatch(string) == dka.compile().fullmatch(string), string
+        assert dka.match(string) == dka.compile().match(string), string
+
+
+def test_stats(build_dka):
+    dka = build_dka('(a|b)*abb')
+    assert dka.fullmatch('aabb') and not dka.fullmatch('bbbb') and not dka.fullmatch('abba')
+    assert dka.prefilter.stats() == {'literals': ['abb'], 'checked': 3, 'skipped': 1, 'hits': 2,
+                                     'hit_rate': 2 / 3, 'skip_rate': 1 / 3}
+
+
+def test_no_literals_is_transparent(build_dka):
+    dka = build_dka('[a-z]*')
+    assert not dka.prefilter
+    assert dka.fullmatch('abc') and dka.fullmatch('')
+    assert dka.prefilter.checked == 0
+    assert Prefilter().stats()['skip_rate'] == 0.0
+
+
+def test_eval_many(build_dka, all_strings):
+    dka = build_dka('x[a-c]*y|z')
+    strings = list(all_strings('abxyz', 4))
+    assert list(dka.eval_many(strings)) == list(dka.compile().eval_many(strings))
+    assert dka.prefilter.checked == len(strings)
+
+
+def test_finditer_bytes(build_dka):
+    dka = build_dka('x[a-c]*y')
+    assert list(dka.finditer(b'qqq' * 1000)) == []
+    assert dka.prefilter.skipped == 1
+    assert list(dka.finditer(b'qq xaby q')) == [(3, 7)]
+    assert list(build_dka('ё').finditer(b'\xd1\x91')) == []
+
+
+def test_kept_by_minimize_cache_and_pickle(tmp_path):
+    dka = get_dka('((a|b)*abb)#')
+    dka.minimize()
+    assert dka.prefilter.literals == ('abb',)
+    assert pickle.loads(pickle.dumps(dka)).prefilter.literals == ('abb',)
+    DKACache(str(tmp_path)).get('((a|b)*abb)#')
+    assert DKACache(str(tmp_path)).get('((a|b)*abb)#').prefilter.literals == ('abb',)
+
+
+def test_disk_hit_does_not_parse(tmp_path, monkeypatch):
+    DKACache(str(tmp_path)).get('((a|b)*abb)#')
+    monkeypatch.setattr(lab1.cache, 'get_syntax_tree', None)
+    cache = DKACache(str(tmp_path))
+    dka = cache.get('((a|b)*abb)#')
+    assert cache.stats['disk'] == 1
+    assert dka.prefilter.literals == ('abb',) and dka.fullmatch('babb')
+
+
+def test_bench_prefilter():
+    [row] = bench_prefilter({'rare': ('abc', 'xyz', 20, 'abc', 0.1)}, samples=200)
+    assert row['literals'] == ['abc']
+    assert 0.5 < row['skip_rate'] < 1
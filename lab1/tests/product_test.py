@@ -0,0 +1,77 @@
+import re
+import pytest
+from lab1.bench import random_dka
+from lab1.classes import DKA
+
+PAIRS = [('(a|b)*abb', 'a(a|b)*'), ('(ab)*', '(a|b)*b'), ('a*', '[a-c]b*'), ('(x|a)*', 'a*(xa*)*')]
+OPS = [('intersection', lambda a, b: a and b), ('union', lambda a, b: a or b),
+       ('difference', lambda a, b: a and not b)]
+
+
+@pytest.mark.parametrize("first, second", PAIRS)
+@pytest.mark.parametrize("op, expected", OPS, ids=[op for op, _ in OPS])
+def test_product_ops(first, second, op, expected, build_dka, all_strings):
+    dka = getattr(build_dka(first), op)(build_dka(second))
+    for string in all_strings('abcx', 5):
+        res = expected(bool(re.fullmatch(first, string)), bool(re.fullmatch(second, string)))
+        assert dka.fullmatch(string) == res, string
+
+
+@pytest.mark.parametrize("regexp", ['(a|b)*abb', 'a[b-c]*', '(ab)*'])
+def test_complement(regexp, build_dka, all_strings):
+    dka = build_dka(regexp)
+    complement = dka.complement()
+    for string in all_strings('abcz', 4):
+        assert complement.fullmatch(string) != dka.fullmatch(string), string
+    assert complement.fullmatch('\U0001f600')
+    assert complement.complement().is_equivalent(dka)
+
+
+@pytest.mark.parametrize("first, second", [('a', 'b'), ('(a|b)*abb', '[a-c]*'), ('[^a]*', 'a|xy')])
+def test_difference_is_intersection_with_complement(first, second, build_dka, all_strings):
+    a, b = build_dka(first), build_dka(second)
+    assert b.difference(a).is_equivalent(a.complement().intersection(b))
+    assert a.union(a.complement()).is_equivalent(build_dka('([^a]|a)*'))
+    for string in all_strings('abcxy', 3):
+        assert a.union(a.complement()).fullmatch(string), string
+
+
+@pytest.mark.parametrize("first, second", [('(a|b)*', '(a*b*)*'), ('(ab)*a', 'a(ba)*'),
+                                           ('[a-c]x|bx', '(a|b|c)x'), ('(a*)*', 'a*|a'),
+                                           ('(x|a)*', 'a*(xa*)*')])
+def test_equivalent_rewrites(first, second, build_dka):
+    assert build_dka(first).is_equivalent(build_dka(second))
+    assert build_dka(first).is_subset(build_dka(second))
+
+
+@pytest.mark.parametrize("first, second", PAIRS[:3] + [('(a|b)*', '(a|b)*c'), ('a', 'b')])
+def test_counterexample(first, second, build_dka):
+    string = build_dka(first).counterexample(build_dka(second))
+    assert string is not None
+    assert bool(re.fullmatch(first, string)) != bool(re.fullmatch(second, string))
+
+
+def test_inclusion(build_dka):
+    small, big = build_dka('a(ba)*'), build_dka('(a|b)*')
+    assert small.is_subset(big)
+    assert not big.is_subset(small)
+    string = big.compile().inclusion_counterexample(small.compile())
+    assert re.fullmatch('(a|b)*', string) and not re.fullmatch('a(ba)*', string)
+    assert build_dka('a*').compile().inclusion_counterexample(build_dka('b').compile()) == ''
+
+
+def test_product_explores_reachable_pairs_only(build_dka):
+    dka = build_dka('a*').intersection(build_dka('b*'))
+    assert len(dka.states) == 1
+    assert dka.fullmatch('') and not dka.fullmatch('a')
+
+
+def test_many_equivalence_checks():
+    dkas = [random_dka(200, seed=seed) for seed in range(20)]
+    for dka in dkas:
+        minimal = DKA.from_compiled(dka.compile().minimize()[0])
+        assert dka.is_equivalent(minimal)
+        # Only the diagonal pairs are reachable in a product with itself.
+        compiled = dka.compile()
+        assert len(compiled.product(compiled, 'intersection')) <= len(compiled)
+        assert dka.is_equivalent(dka)
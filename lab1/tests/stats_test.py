@@ -0,0 +1,46 @@
+import logging
+from lab1.classes import get_dka, get_nka, get_syntax_tree, nka_to_dka, BuildStats
+
+
+def test_get_dka_phases():
+    events = []
+    stats = BuildStats(callback=lambda phase, seconds, counters: events.append((phase, counters)))
+    dka = get_dka('((a|b)*a(a|b)(a|b))#', stats)
+    assert [phase for phase, _ in events] == ['parse', 'attributes', 'subsets', 'views']
+    assert all(seconds >= 0 for seconds in stats.phases.values())
+    counters = stats.as_dict()
+    assert counters['states'] == len(dka.states) == 8
+    assert counters['transitions'] == len(dka.moves) == 16
+    assert counters['peak_subset'] == max(len(state) for state in dka.states)
+    assert 1 <= counters['worklist_peak'] <= 8
+    assert events[2][1]['states'] == 8
+
+    dka.minimize(stats)
+    assert stats.counters['minimized_states'] == 8
+    assert 'minimize' in stats.phases
+
+
+def test_worklist_peak():
+    stats = BuildStats()
+    get_dka('(ab|bc|cd|da)#', stats)
+    assert stats.counters['worklist_peak'] == 4
+    stats = BuildStats()
+    get_dka('(abcd)#', stats)
+    assert stats.counters['worklist_peak'] == 1
+
+
+def test_nka_phases(caplog):
+    stats = BuildStats(logger=logging.getLogger('lab1.build'))
+    with caplog.at_level(logging.INFO, logger='lab1.build'):
+        nka, _ = get_nka(get_syntax_tree('((a|b)*abb)#'), 0, stats)
+        dka = nka_to_dka(nka, stats)
+    assert list(stats.phases) == ['thompson', 'closures', 'subsets', 'views']
+    assert stats.counters['nka_states'] == len(nka.states)
+    assert stats.counters['states'] == len(dka.states)
+    assert [record.getMessage().split(':')[0] for record in caplog.records] == list(stats.phases)
+
+
+def test_stats_are_optional():
+    assert get_dka('(ab)#').fullmatch('ab')
+    nka, _ = get_nka(get_syntax_tree('(ab)#'), 0)
+    assert nka_to_dka(nka).minimize() == [0, 1, 2]
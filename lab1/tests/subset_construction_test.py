@@ -0,0 +1,31 @@
+import re
+import pytest
+from lab1.classes import get_dka, get_nka, get_syntax_tree, nka_to_dka
+
+REGEXPS = ['(a|b)*abb', 'a(b|c)*d', '(a|b)*a(a|b)(a|b)', '(ab)*c*', '(cd*|ab|(c|a*))(c|d*)']
+
+
+@pytest.mark.parametrize("regexp", REGEXPS)
+def test_nka_to_dka_agrees_with_re(regexp, all_strings):
+    nka, _ = get_nka(get_syntax_tree(f'({regexp})#'), 0)
+    dka = nka_to_dka(nka)
+
+    for string in all_strings('abcd', 5):
+        assert dka.fullmatch(string) == bool(re.fullmatch(regexp, string)), string
+
+
+@pytest.mark.parametrize("n", [1, 4, 8])
+def test_blow_up_family_state_count(n):
+    dka = get_dka('((a|b)*a' + '(a|b)' * n + ')#')
+
+    assert len(dka.states) == 2 ** (n + 1)
+    assert len(dka.moves) == 2 * len(dka.states)
+    assert len(set(frozenset(state) for state in dka.states)) == len(dka.states)
+
+
+def test_dka_states_are_position_sets(build_dka):
+    dka = build_dka('(a|b)*abb')
+
+    assert dka.q0 == {1, 2, 3}
+    assert dka.states[0] == dka.q0
+    assert all(6 in state for state in dka.finish_states)
@@ -0,0 +1,62 @@
+import pytest
+from lab1.classes import get_syntax_tree
+
+REGEXPS = ['(a|b)*abb#', '(xy*|ab|(x|a*))(x|y*)#', '((ab)*|c)*d#', '(a*b*)*(c|d*)#', 'a#']
+
+
+def legacy_attributes(tree, count):
+    return [(node.nullable(), sorted(node.firstpos()), sorted(node.lastpos())) for node in tree.postorder()], \
+           [tree.followpos(i) for i in range(1, count)]
+
+
+@pytest.mark.parametrize("regexp", REGEXPS)
+def test_attributes_match_recursive_definitions(regexp):
+    tree = get_syntax_tree(regexp)
+    count = tree.set_idx()
+    expected_nodes, expected_follow = legacy_attributes(tree, count)
+    follow = tree.calc_attributes()
+
+    assert len(follow) == count
+    assert legacy_attributes(tree, count) == (expected_nodes, expected_follow)
+    assert [node.is_nullable for node in tree.postorder()] == [x[0] for x in expected_nodes]
+
+
+def prefix(tree):
+    if not tree.left:
+        return tree.data
+    return f"({tree.data} {prefix(tree.left)}{' ' + prefix(tree.right) if tree.right else ''})"
+
+
+@pytest.mark.parametrize("regexp, expected", [
+    ('(a|b)*abb#', '(cat (cat (cat (cat (* (| a b)) a) b) b) #)'),
+    ('(xy*|ab|(x|a*))(x|y*)#', '(cat (cat (| (| (cat x (* y)) (cat a b)) (| x (* a))) (| x (* y))) #)'),
+    ('a|b|c', '(| (| a b) c)'),
+    ('abc', '(cat (cat a b) c)'),
+    ('a**', '(* (* a))'),
+    ('((a))', 'a'),
+    ('(ab)*(c)d*|e#', '(| (cat (cat (* (cat a b)) c) (* d)) (cat e #))'),
+])
+def test_syntax_tree_shape(regexp, expected):
+    assert prefix(get_syntax_tree(regexp)) == expected
+
+
+@pytest.mark.parametrize("regexp", ['', '()', 'a|', '|a', '*a', '(a', 'a)', 'a(|b)', '(a|)b'])
+def test_syntax_tree_errors(regexp):
+    with pytest.raises(ValueError):
+        get_syntax_tree(regexp)
+
+
+@pytest.mark.parametrize("regexp", ['(' * 50000 + 'a' + ')' * 50000 + '#', 'ab' * 50000 + '#',
+                                    '|'.join('abc') * 30000 + '#', 'a(b|c)*d' * 15000 + '#'],
+                         ids=['nested', 'concatenation', 'alternation', 'mixed'])
+def test_long_regexp(regexp):
+    tree = get_syntax_tree(regexp)
+
+    assert tree.set_idx() - 1 == sum(1 for x in regexp if x not in '()|*')
+
+
+def test_deep_regexp_attributes():
+    tree = get_syntax_tree('(' * 50000 + 'a*b' + ')*' * 50000 + '#')
+
+    assert len(tree.calc_attributes()) == 4
+    assert tree.left.is_nullable and tree.first_mask == 0b1110
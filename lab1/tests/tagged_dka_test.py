@@ -0,0 +1,75 @@
+import re
+import pytest
+from lab1.classes import get_syntax_tree, get_tagged_dka, BuildStats
+
+REGEXPS = ['(xy*)|(ab)', '(a|b)*(ab)', '((a)|b)*', '(a*)(a*)', '(a|ab)(c|bcd)(d*)', '((a)|(b))*c',
+           '(x(a|b)*y)*', '((ab)*|b)a', '([ab]*)(b[ab])', '(a*)b(a*)|(b*)', '(x*)(x|y)*', '(((a)))', 'a(b|c)*d']
+
+
+def re_spans(regexp, string):
+    m = re.fullmatch(regexp, string)
+    if m is None:
+        return None
+    return tuple(None if m.span(i) == (-1, -1) else m.span(i) for i in range(1, len(m.groups()) + 1))
+
+
+def test_groups_in_tree():
+    tree = get_syntax_tree('((a)|b)*(c)')
+    assert tree.right.groups == (3,)
+    assert tree.left.left.groups == (1,)
+    assert tree.left.left.left.groups == (2,)
+    assert get_syntax_tree('((a))').groups == (2, 1)
+
+
+@pytest.mark.parametrize("regexp", REGEXPS)
+def test_captures_agree_with_re(regexp, all_strings):
+    tagged = get_tagged_dka(regexp)
+    for string in all_strings('abcdxy', 5):
+        assert tagged.fullmatch(string) == re_spans(regexp, string), string
+
+
+@pytest.mark.parametrize("regexp, string, spans", [
+    ('(a*)*', 'aa', ((0, 2),)),
+    ('(a*)*', '', (None,)),
+    ('((a)*)*', '', (None, None)),
+    ('(((a))*)*(b|c)a', 'ba', (None, None, None, (0, 1))),
+    ('(a|b*)*', 'ab', ((1, 2),)),
+])
+def test_no_empty_last_iteration(regexp, string, spans):
+    # Documented difference from re for stars whose body can match ''.
+    assert get_tagged_dka(regexp).fullmatch(string) == spans
+    assert re_spans(regexp, string) != spans
+
+
+def test_example():
+    tagged = get_tagged_dka('(xy*)|(ab)')
+    assert tagged.fullmatch('xyy') == ((0, 3), None)
+    assert tagged.groups_of('ab') == (None, 'ab')
+    assert tagged.fullmatch('abx') is None
+    assert tagged.fullmatch('q') is None
+
+
+def test_log_line():
+    tagged = get_tagged_dka('([0-9]*)-([0-9]*) ([a-z]*): ([^!]*)')
+    assert tagged.groups_of('2024-10 error: disk full') == ('2024', '10', 'error', 'disk full')
+    assert tagged.groups_of('2024-10 error: disk full!') is None
+
+
+def test_moves_mostly_set_in_place():
+    tagged = get_tagged_dka('([a-z]*) ([^ ]*)')
+    width = tagged.compiled.width
+    loops = [state * width + sym for state in range(len(tagged) - 1) for sym in range(width)
+             if tagged.compiled.delta[state * width + sym] == state]
+    assert loops and all(tagged.copies[move] is None and len(tagged.sets[move]) <= 1 for move in loops)
+    string = 'a' * 10000 + ' ' + 'b' * 10000
+    assert tagged.fullmatch(string) == ((0, 10000), (10001, 20001))
+
+
+def test_no_groups_and_stats():
+    stats = BuildStats()
+    tagged = get_tagged_dka('ab*', stats)
+    assert list(stats.phases) == ['parse', 'tags', 'subsets']
+    assert stats.counters['states'] == len(tagged) - 1
+    assert tagged.fullmatch('abb') == () and tagged.fullmatch('ba') is None
+    with pytest.raises(ValueError):
+        get_tagged_dka('a#')